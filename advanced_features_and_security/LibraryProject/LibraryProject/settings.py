@@ -111,6 +111,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'relationship_app.roles.role',
             ],
         },
     },
@@ -130,6 +131,12 @@ DATABASES = {
 }
 
 
+# Permission checks are compiled per user and cached, see relationship_app/backends.py
+AUTHENTICATION_BACKENDS = [
+    'relationship_app.backends.CachedPermissionBackend',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,116 @@
+"""
+A ModelBackend whose permission checks are served from a cache.
+
+ModelBackend loads a user's own permissions and their groups' permissions
+with two queries the first time a request checks one. This backend
+compiles the same set, as a frozenset of 'app_label.codename' strings, in
+one query and keeps it in the Django cache, so later requests check
+permissions without touching the database.
+
+A user's entry is dropped when their groups, own permissions or
+superuser flag change. Changes that can affect many users at once (a
+group's permissions, deleting a group or permission) bump a version that
+is part of every key instead. The receivers are connected in
+RelationshipAppConfig.ready().
+
+    AUTHENTICATION_BACKENDS = ['relationship_app.backends.CachedPermissionBackend']
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+User = get_user_model()
+
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+VERSION_KEY = 'relationship_app:perms:version'
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def _key(user_id):
+    return f'relationship_app:perms:{_version()}:{user_id}'
+
+
+def compile_permissions(user):
+    """Every permission `user` has through ModelBackend's rules, in one query"""
+    perms = Permission.objects.all()
+    if not user.is_superuser:
+        perms = perms.filter(Q(user=user) | Q(group__user=user))
+    return frozenset(
+        f'{app_label}.{codename}'
+        for app_label, codename in perms.values_list('content_type__app_label', 'codename').distinct()
+    )
+
+
+class CachedPermissionBackend(ModelBackend):
+    """ModelBackend with get_all_permissions() compiled once and cached per user"""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return frozenset()
+        if not hasattr(user_obj, '_compiled_perm_cache'):
+            key = _key(user_obj.pk)
+            perms = cache.get(key)
+            if perms is None:
+                perms = compile_permissions(user_obj)
+                cache.set(key, perms, PERMISSION_CACHE_TIMEOUT)
+            user_obj._compiled_perm_cache = perms
+        return user_obj._compiled_perm_cache
+
+
+def invalidate_user(user_id):
+    cache.delete(_key(user_id))
+    # Again after commit, in case a request compiled the old set in between
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # not set yet (or evicted)
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_all():
+    _bump_version()
+    transaction.on_commit(_bump_version)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_links_changed(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, User):
+        invalidate_user(instance.pk)
+    else:
+        # group.user_set.add(...) or permission.user_set.add(...)
+        invalidate_all()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_all()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def group_or_permission_deleted(sender, **kwargs):
+    invalidate_all()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # The login signal saves only last_login, which can't change permissions
+    if not created and update_fields != frozenset({'last_login'}):
+        invalidate_user(instance.pk)
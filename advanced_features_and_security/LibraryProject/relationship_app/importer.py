@@ -0,0 +1,137 @@
+"""
+Bulk loading of books, their authors and library holdings.
+
+Rows are dicts with 'title' and 'author' and optionally 'library', all
+names. They are consumed in chunks, one transaction per chunk, so memory
+use depends on the chunk size and not on how many rows there are. Only
+the author and library name -> id maps live for the whole import.
+
+Per chunk, books that already exist (same title and author) are reused
+rather than duplicated, so an interrupted import can simply be run
+again. New authors and books are inserted with one bulk INSERT each,
+library links with one conflict-ignoring INSERT.
+
+bulk_create() sends no signals, so the denormalized Library.book_count
+and the cached catalogue pages are brought up to date once at the end.
+"""
+import itertools
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .catalogue import bump_version
+from .models import Author, Book, Library, update_book_counts
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_TITLE_LENGTH = Book._meta.get_field('title').max_length
+MAX_AUTHOR_LENGTH = Author._meta.get_field('name').max_length
+MAX_LIBRARY_LENGTH = Library._meta.get_field('name').max_length
+LibraryBook = Library.books.through
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    books_created: int = 0
+    books_existing: int = 0
+    authors_created: int = 0
+    links: int = 0  # written or already there
+    invalid: int = 0
+    library_ids: set = field(default_factory=set)
+
+
+def clean(row):
+    """(title, author, library or None), or None if the row can't be imported"""
+    title = (row.get('title') or '').strip()
+    author = (row.get('author') or '').strip()
+    library = (row.get('library') or '').strip() or None
+    if not title or not author or len(title) > MAX_TITLE_LENGTH or len(author) > MAX_AUTHOR_LENGTH:
+        return None
+    if library and len(library) > MAX_LIBRARY_LENGTH:
+        return None
+    return title, author, library
+
+
+class Importer:
+    def __init__(self):
+        self.stats = ImportStats()
+        # A name that occurs more than once maps to its lowest id
+        self.author_ids = {}
+        for name, author_id in Author.objects.order_by('-id').values_list('name', 'id').iterator():
+            self.author_ids[name] = author_id
+        self.library_ids = {}
+        for name, library_id in Library.objects.order_by('-id').values_list('name', 'id').iterator():
+            self.library_ids[name] = library_id
+
+    def _resolve_authors(self, names):
+        new = [name for name in dict.fromkeys(names) if name not in self.author_ids]
+        if new:
+            Author.objects.bulk_create([Author(name=name) for name in new])
+            for name, author_id in Author.objects.filter(name__in=new).order_by('-id').values_list('name', 'id'):
+                self.author_ids[name] = author_id
+            self.stats.authors_created += len(new)
+
+    def _resolve_libraries(self, names):
+        for name in dict.fromkeys(names):
+            if name not in self.library_ids:
+                self.library_ids[name] = Library.objects.create(name=name).pk
+
+    def _book_ids(self, keys):
+        """(title, author id) -> book id for the keys that exist"""
+        wanted = set(keys)
+        books = Book.objects.filter(
+            title__in={title for title, _ in wanted}, author_id__in={author_id for _, author_id in wanted}
+        ).order_by('-id').values_list('id', 'title', 'author_id')
+        return {(title, author_id): book_id for book_id, title, author_id in books
+                if (title, author_id) in wanted}
+
+    def import_chunk(self, rows):
+        self.stats.rows += len(rows)
+        cleaned = [row for row in map(clean, rows) if row is not None]
+        self.stats.invalid += len(rows) - len(cleaned)
+        if not cleaned:
+            return
+        with transaction.atomic():
+            self._resolve_authors([author for _, author, _ in cleaned])
+            self._resolve_libraries([library for _, _, library in cleaned if library])
+            keys = list(dict.fromkeys((title, self.author_ids[author]) for title, author, _ in cleaned))
+            book_ids = self._book_ids(keys)
+            new = [key for key in keys if key not in book_ids]
+            self.stats.books_existing += len(keys) - len(new)
+            if new:
+                Book.objects.bulk_create([Book(title=title, author_id=author_id) for title, author_id in new])
+                book_ids.update(self._book_ids(new))
+                self.stats.books_created += len(new)
+            links = {
+                (self.library_ids[library], book_ids[(title, self.author_ids[author])])
+                for title, author, library in cleaned if library
+            }
+            if links:
+                LibraryBook.objects.bulk_create(
+                    [LibraryBook(library_id=library_id, book_id=book_id) for library_id, book_id in links],
+                    ignore_conflicts=True,
+                )
+                self.stats.links += len(links)
+                self.stats.library_ids.update(library_id for library_id, _ in links)
+
+    def finish(self):
+        if self.stats.library_ids:
+            update_book_counts(self.stats.library_ids)
+        transaction.on_commit(bump_version)
+        return self.stats
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def import_rows(rows, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Import an iterable of row dicts; `progress(stats)` is called after each chunk"""
+    importer = Importer()
+    for chunk in chunked(rows, chunk_size):
+        importer.import_chunk(chunk)
+        if progress:
+            progress(importer.stats)
+    return importer.finish()
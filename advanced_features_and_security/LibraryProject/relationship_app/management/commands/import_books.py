@@ -0,0 +1,58 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from relationship_app.importer import DEFAULT_CHUNK_SIZE, import_rows
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise CommandError(f'Line {number}: {e}')
+
+
+class Command(BaseCommand):
+    help = ('Bulk import books from CSV or JSON Lines with title, author and optional '
+            'library columns, streaming the input in chunks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or - for stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension, csv for stdin)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows written per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        reader = read_jsonl if fmt == 'jsonl' else read_csv
+        started = time.monotonic()
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{stats.rows} rows, {stats.rows / (time.monotonic() - started):.0f} rows/s')
+
+        try:
+            if path == '-':
+                stats = import_rows(reader(sys.stdin), options['chunk_size'], progress)
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    stats = import_rows(reader(stream), options['chunk_size'], progress)
+        except OSError as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.rows} rows in {elapsed:.1f}s ({stats.rows / max(elapsed, 1e-9):.0f} rows/s): '
+            f'{stats.books_created} new books, {stats.books_existing} already there, '
+            f'{stats.authors_created} new authors, {stats.links} library links, {stats.invalid} invalid rows'
+        ))
@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
 from django.dispatch import receiver
 
 User = get_user_model()
@@ -31,6 +34,9 @@ class Book(models.Model):
             ("can_delete_book", "Can delete book"),
             ("can_view_book", "Can view book"),
         ]
+        indexes = [
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+        ]
 
 
 class Library(models.Model):
@@ -39,6 +45,8 @@ class Library(models.Model):
         Book,
         related_name='libraries'
     )
+    # len(books), kept current by the receivers at the bottom of this file
+    book_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name  # shows the library name
@@ -71,5 +79,72 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save()
\ No newline at end of file
+def save_user_profile(sender, instance, created, **kwargs):
+    # Only a profile that was loaded through this user and edited needs saving;
+    # a plain User save (e.g. the last_login update at login) touches nothing
+    profile = instance._state.fields_cache.get('userprofile')
+    if profile is not None and not created and profile.role != profile._saved_role:
+        profile.save()
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_saved_role(sender, instance, **kwargs):
+    instance._saved_role = instance.role
+
+
+# CACHED ROLES (see roles.py) GO STALE WHEN A PROFILE CHANGES
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_role(sender, instance, **kwargs):
+    from .roles import invalidate_role
+    instance._saved_role = instance.role
+    invalidate_role(instance.user_id)
+    # Again after commit, in case a request cached the old role in between
+    transaction.on_commit(lambda: invalidate_role(instance.user_id))
+
+
+# CACHED CATALOGUE PAGES (see catalogue.py) GO STALE WHEN A BOOK OR AUTHOR CHANGES
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def bump_catalogue_version(sender, **kwargs):
+    from .catalogue import bump_version
+    transaction.on_commit(bump_version)
+
+
+# KEEP Library.book_count IN STEP WITH THE M2M TABLE
+def update_book_counts(library_ids):
+    holdings = (
+        Library.books.through.objects.filter(library=OuterRef('pk'))
+        .values('library').annotate(n=Count('pk')).values('n')
+    )
+    Library.objects.filter(pk__in=library_ids).update(
+        book_count=Coalesce(Subquery(holdings), 0)
+    )
+
+
+@receiver(m2m_changed, sender=Library.books.through)
+def library_books_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # book.libraries.clear(): remember which libraries lose the book
+        instance._cleared_library_ids = list(instance.libraries.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            update_book_counts([instance.pk])
+        elif action == 'post_clear':
+            update_book_counts(getattr(instance, '_cleared_library_ids', []))
+        else:
+            update_book_counts(pk_set)
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_libraries(sender, instance, **kwargs):
+    # Deleting a book drops its M2M rows without an m2m_changed signal
+    instance._library_ids = list(instance.libraries.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def recount_book_libraries(sender, instance, **kwargs):
+    if getattr(instance, '_library_ids', None):
+        update_book_counts(instance._library_ids)
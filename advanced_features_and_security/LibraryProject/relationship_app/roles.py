@@ -0,0 +1,46 @@
+"""
+Role lookups for the role-based views and templates.
+
+A user's role is read from UserProfile at most once per request (it is
+kept on the request's user object) and is cached per user in the Django
+cache in between, so the dashboards and the navbar don't each run a
+OneToOne query. Saving or deleting a UserProfile drops the cached role,
+see the receivers in models.py.
+"""
+from functools import partial
+
+from django.core.cache import cache
+
+ROLE_CACHE_TIMEOUT = 60 * 60
+NO_ROLE = ''  # cached for users without a profile, so they are not looked up again
+
+
+def _key(user_id):
+    return f'relationship_app:role:{user_id}'
+
+
+def get_role(user):
+    """'Admin', 'Librarian', 'Member', or None for anonymous users and users without a profile"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user._role
+    except AttributeError:
+        pass
+    role = cache.get(_key(user.pk))
+    if role is None:
+        from .models import UserProfile
+        role = UserProfile.objects.filter(user_id=user.pk).values_list('role', flat=True).first()
+        role = role or NO_ROLE
+        cache.set(_key(user.pk), role, ROLE_CACHE_TIMEOUT)
+    user._role = role or None
+    return user._role
+
+
+def invalidate_role(user_id):
+    cache.delete(_key(user_id))
+
+
+def role(request):
+    """Context processor: {{ user_role }}, looked up only if a template uses it"""
+    return {'user_role': partial(get_role, request.user)}
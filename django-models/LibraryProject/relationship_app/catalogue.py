@@ -0,0 +1,79 @@
+"""
+Cached pages of the book catalogue shown by list_books.
+
+A page is cached under the catalogue version, its sort order and its
+number. Saving or deleting a Book or Author (add_book, edit_book,
+delete_book, the admin) bumps the version once the transaction commits,
+see the receivers in models.py, which retires every cached page at once.
+
+The version is the time of the last change in nanoseconds, so it doubles
+as the Last-Modified date and the ETag of every page: a client holding a
+current page gets a 304 without anything being queried or rendered.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+from .models import Book
+
+PAGE_SIZE = 25
+CACHE_TIMEOUT = 60 * 60
+VERSION_KEY = 'relationship_app:catalogue:version'
+
+# ?sort= value -> order_by(); the trailing id keeps pages stable on ties
+SORTS = {
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+    'author': ('author__name', 'title', 'id'),
+    '-author': ('-author__name', '-title', '-id'),
+}
+DEFAULT_SORT = 'title'
+
+
+def catalogue_version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def bump_version():
+    """Retire every cached page"""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def last_modified(version):
+    return datetime.fromtimestamp(version / 1e9, tz=timezone.utc)
+
+
+def parse_sort(value):
+    return value if value in SORTS else DEFAULT_SORT
+
+
+def parse_page(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def catalogue_page(sort, number, version=None):
+    """
+    One page of books with their authors, as a dict with the books and the
+    page number, page count and book count for the pagination links.
+    """
+    if version is None:
+        version = catalogue_version()
+    key = f'relationship_app:catalogue:{version}:{sort}:{number}'
+    page = cache.get(key)
+    if page is None:
+        books = Book.objects.select_related('author').order_by(*SORTS[sort])
+        paginator = Paginator(books, PAGE_SIZE)
+        current = paginator.get_page(number)
+        page = {
+            'books': list(current),
+            'number': current.number,
+            'num_pages': paginator.num_pages,
+            'count': paginator.count,
+        }
+        cache.set(key, page, CACHE_TIMEOUT)
+    return page
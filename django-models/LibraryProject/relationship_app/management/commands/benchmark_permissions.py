@@ -0,0 +1,62 @@
+import copy
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from relationship_app import backends
+
+
+class Command(BaseCommand):
+    help = ('Compare permission checks through ModelBackend and CachedPermissionBackend '
+            'for a throwaway user in many groups (rolled back afterwards)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=50,
+                            help='Groups the benchmark user belongs to')
+        parser.add_argument('--perms-per-group', type=int, default=20,
+                            help='Permissions granted to each group')
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Simulated requests, each with a fresh user object')
+        parser.add_argument('--checks', type=int, default=4,
+                            help='has_perm() calls per request')
+
+    def handle(self, *args, **options):
+        perm_names = [
+            f'{app_label}.{codename}'
+            for app_label, codename in Permission.objects.values_list('content_type__app_label', 'codename')
+        ]
+        if not perm_names:
+            raise CommandError('No permissions in the database; run migrate first')
+        sample = min(options['perms_per_group'], len(perm_names))
+        checks = [random.choice(perm_names) for _ in range(options['checks'])]
+
+        with transaction.atomic():
+            user = get_user_model().objects.create(username=f'perm-benchmark-{time.time_ns()}')
+            perm_ids = list(Permission.objects.values_list('id', flat=True))
+            for i in range(options['groups']):
+                group = Group.objects.create(name=f'perm-benchmark-{user.pk}-{i}')
+                group.permissions.set(random.sample(perm_ids, sample))
+                user.groups.add(group)
+
+            for name, backend in [('ModelBackend', ModelBackend()),
+                                  ('CachedPermissionBackend', backends.CachedPermissionBackend())]:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(options['requests']):
+                        request_user = copy.copy(user)  # no per-object permission cache yet
+                        for perm in checks:
+                            backend.has_perm(request_user, perm)
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{name:<24} {elapsed / options["requests"] * 1e6:9.1f} µs/request  '
+                    f'{len(queries) / options["requests"]:.2f} queries/request'
+                )
+            transaction.set_rollback(True)
+        # The throwaway user's id may be handed out again, so retire its cached set
+        backends.invalidate_all()
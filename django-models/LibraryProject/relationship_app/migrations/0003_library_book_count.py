@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:22
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_book_counts(apps, schema_editor):
+    Library = apps.get_model('relationship_app', 'Library')
+    for library in Library.objects.annotate(n=Count('books')).iterator():
+        Library.objects.filter(pk=library.pk).update(book_count=library.n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0002_userprofile_book_title_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='library',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_book_counts, migrations.RunPython.noop),
+    ]
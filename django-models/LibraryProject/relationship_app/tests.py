@@ -1,3 +1,207 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import catalogue
+from .models import Author, Book, Library, UserProfile
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.austen = Author.objects.create(name='Austen')
+        self.bronte = Author.objects.create(name='Bronte')
+        for i in range(30):
+            Book.objects.create(title=f'Book {i:02d}', author=self.austen if i % 2 else self.bronte)
+
+    def test_pages_are_sorted_and_limited(self):
+        response = self.client.get(reverse('book_list'))
+        books = response.context['books']
+        self.assertEqual(len(books), catalogue.PAGE_SIZE)
+        self.assertEqual(books[0].title, 'Book 00')
+        self.assertEqual(response.context['page']['num_pages'], 2)
+
+        response = self.client.get(reverse('book_list'), {'sort': '-author', 'page': 2})
+        self.assertEqual(response.context['page']['number'], 2)
+        self.assertTrue(all(book.author.name == 'Austen' for book in response.context['books']))
+
+    def test_cached_page_needs_no_queries(self):
+        self.client.get(reverse('book_list'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('book_list'))
+        self.assertEqual(len(queries), 0)
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get(reverse('book_list'), {'page': 2})
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(
+            reverse('book_list'), {'page': 2}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_add_book_retires_cached_pages(self):
+        user = User.objects.create_user('librarian', password='pw')
+        user.user_permissions.add(Permission.objects.get(codename='can_add_book'))
+        self.client.force_login(user)
+        etag = self.client.get(reverse('book_list'))['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_book'), {'title': 'Aaa', 'author': self.austen.pk})
+
+        response = self.client.get(reverse('book_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['books'][0].title, 'Aaa')
+
+
+class LibraryHoldingsTests(TestCase):
+    def setUp(self):
+        self.library = Library.objects.create(name='Central')
+        self.author = Author.objects.create(name='Tolstoy')
+        self.books = [Book.objects.create(title=f'Volume {i:03d}', author=self.author) for i in range(60)]
+        self.library.books.add(*self.books)
+
+    def test_book_count_follows_the_m2m_table(self):
+        self.library.refresh_from_db()
+        self.assertEqual(self.library.book_count, 60)
+        self.library.books.remove(self.books[0])
+        self.books[1].libraries.clear()
+        self.books[2].delete()
+        self.library.refresh_from_db()
+        self.assertEqual(self.library.book_count, 57)
+
+    def test_page_is_limited_and_counted_without_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('library_detail', args=[self.library.pk]))
+        self.assertEqual(len(response.context['books']), 50)
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+        self.assertFalse(any('COUNT' in query['sql'] for query in queries.captured_queries))
+
+    def test_search_within_holdings(self):
+        other = Book.objects.create(title='Volume 999', author=self.author)
+        response = self.client.get(reverse('library_detail', args=[self.library.pk]), {'q': 'volume 05'})
+        titles = [book.title for book in response.context['books']]
+        self.assertEqual(titles, [f'Volume 05{i}' for i in range(10)])
+        self.assertNotIn(other.title, titles)
+
+    def test_export_streams_csv(self):
+        response = self.client.get(reverse('library_export', args=[self.library.pk]))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,title,author')
+        self.assertEqual(len(lines), 61)
+
+
+class RoleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ada', password='pw')
+
+    def set_role(self, role):
+        profile = UserProfile.objects.get(user=self.user)
+        profile.role = role
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+
+    def test_role_is_cached_across_requests(self):
+        self.set_role('Librarian')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('librarian_view')).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('librarian_view'))
+        self.assertFalse(any('userprofile' in query['sql'] for query in queries.captured_queries))
+
+    def test_role_change_takes_effect(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('member_view')).status_code, 200)
+        self.set_role('Librarian')
+        self.assertEqual(self.client.get(reverse('member_view')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('librarian_view')).status_code, 200)
+
+    def test_user_save_writes_profile_only_when_changed(self):
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertFalse(any('userprofile' in query['sql'] for query in queries.captured_queries))
+
+        user.userprofile.role = 'Admin'
+        user.save()
+        self.assertEqual(UserProfile.objects.get(user=user).role, 'Admin')
+
+
+class CachedPermissionBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('grace', password='pw')
+        self.group = Group.objects.create(name='Librarians')
+        self.group.permissions.add(Permission.objects.get(codename='can_add_book'))
+        self.user.groups.add(self.group)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_permissions_are_cached_across_requests(self):
+        self.assertTrue(self.fresh_user().has_perm('relationship_app.can_add_book'))
+        user = self.fresh_user()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(user.has_perm('relationship_app.can_add_book'))
+            self.assertFalse(user.has_perm('relationship_app.can_delete_book'))
+        self.assertEqual(len(queries), 0)
+
+    def test_group_permission_change_invalidates(self):
+        self.assertFalse(self.fresh_user().has_perm('relationship_app.can_delete_book'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.add(Permission.objects.get(codename='can_delete_book'))
+        self.assertTrue(self.fresh_user().has_perm('relationship_app.can_delete_book'))
+
+    def test_leaving_a_group_invalidates(self):
+        self.assertTrue(self.fresh_user().has_perm('relationship_app.can_add_book'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.group)
+        self.assertFalse(self.fresh_user().has_perm('relationship_app.can_add_book'))
+
+
+class ImportBooksTests(TestCase):
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        Author.objects.create(name='Austen')
+
+    def test_csv_import_is_chunked_and_idempotent(self):
+        path = self.write('books.csv', 'title,author,library\n' + ''.join(
+            f'Book {i},{"Austen" if i % 2 else "Orwell"},Central\n' for i in range(25)
+        ) + ',Nobody,Central\n')
+        out = StringIO()
+        call_command('import_books', path, '--chunk-size', '10', stdout=out)
+        self.assertIn('25 new books', out.getvalue())
+        self.assertIn('1 invalid rows', out.getvalue())
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Library.objects.get(name='Central').book_count, 25)
+
+        call_command('import_books', path, '--chunk-size', '7', stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 25)
+        self.assertEqual(Library.objects.get(name='Central').books.count(), 25)
 
-# Create your tests here.
+    def test_jsonl_import(self):
+        path = self.write('books.jsonl', '\n'.join([
+            json.dumps({'title': 'Emma', 'author': 'Austen'}),
+            json.dumps({'title': 'Persuasion', 'author': 'Austen', 'library': 'East'}),
+        ]))
+        call_command('import_books', path, stdout=StringIO())
+        self.assertEqual(sorted(Book.objects.filter(author__name='Austen').values_list('title', flat=True)),
+                         ['Emma', 'Persuasion'])
+        self.assertEqual(Library.objects.get(name='East').book_count, 1)
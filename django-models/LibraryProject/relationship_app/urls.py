@@ -14,6 +14,7 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(template_name='relationship_app/logout.html'), name='logout'),
     path('books/', list_books, name='book_list'),
     path('library/<int:pk>/', LibraryDetailView.as_view(), name='library_detail'),
+    path('library/<int:pk>/export.csv', views.export_library, name='library_export'),
     
      # Role-based URLs
     path('admin/dashboard/', admin_view, name='admin_view'),
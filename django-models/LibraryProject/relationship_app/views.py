@@ -1,6 +1,11 @@
+import csv
+import itertools
+
 from django.shortcuts import render, redirect,  get_object_or_404
 from  relationship_app.models import Book, Author
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.db.models import Q
 from .models import Library
 from django.views.generic.detail import DetailView
 from django.contrib.auth.forms import UserCreationForm
@@ -11,6 +16,9 @@ from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth.decorators import permission_required
 from .models import UserProfile
 from django.contrib import messages
+from django.views.decorators.http import condition
+from . import catalogue
+from .roles import get_role
 
 class SignUpView(CreateView):
     form_class = UserCreationForm
@@ -38,27 +46,89 @@ def register(request):
         form = UserCreationForm()
     return render(request, 'relationship_app/register.html', {'form': form})
 
+def _catalogue_version(request):
+    # Read once per request, so the ETag, Last-Modified and page all agree
+    if not hasattr(request, '_catalogue_version'):
+        request._catalogue_version = catalogue.catalogue_version()
+    return request._catalogue_version
+
+
+def _catalogue_etag(request):
+    sort = catalogue.parse_sort(request.GET.get('sort'))
+    page = catalogue.parse_page(request.GET.get('page'))
+    return f'{_catalogue_version(request)}-{sort}-{page}'
+
+
+def _catalogue_last_modified(request):
+    return catalogue.last_modified(_catalogue_version(request))
+
+
+@condition(etag_func=_catalogue_etag, last_modified_func=_catalogue_last_modified)
 def list_books(request):
-    all_books = Book.objects.all()
-    context = {'books': all_books}
+    sort = catalogue.parse_sort(request.GET.get('sort'))
+    page = catalogue.catalogue_page(
+        sort, catalogue.parse_page(request.GET.get('page')), _catalogue_version(request)
+    )
+    context = {'books': page['books'], 'page': page, 'sort': sort}
     return render(request, 'relationship_app/list_books.html', context)
     
 
+def library_holdings(library, query=''):
+    """The library's books with their authors, optionally narrowed by title/author"""
+    books = library.books.select_related('author').order_by('title', 'id')
+    if query:
+        books = books.filter(Q(title__icontains=query) | Q(author__name__icontains=query))
+    return books
+
+
 class LibraryDetailView(DetailView):
     model = Library
     template_name = 'relationship_app/library_detail.html'
     context_object_name = 'library'
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        paginator = Paginator(library_holdings(self.object, query), self.paginate_by)
+        if not query:
+            # The denormalized count saves a COUNT(*) over the whole M2M set
+            paginator.count = self.object.book_count
+        page = paginator.get_page(self.request.GET.get('page'))
+        context.update(books=page.object_list, page_obj=page, query=query)
+        return context
+
+
+class Echo:
+    """File-like object whose write() hands the row back to the csv writer's caller"""
+    def write(self, value):
+        return value
+
+
+def export_library(request, pk):
+    """The library's holdings as CSV, streamed in chunks rather than built in memory"""
+    library = get_object_or_404(Library, pk=pk)
+    query = request.GET.get('q', '').strip()
+    rows = library_holdings(library, query).values_list('id', 'title', 'author__name')
+    writer = csv.writer(Echo())
+    lines = itertools.chain(
+        [writer.writerow(['id', 'title', 'author'])],
+        (writer.writerow(row) for row in rows.iterator(chunk_size=2000)),
+    )
+    response = StreamingHttpResponse(lines, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="library-{library.pk}.csv"'
+    return response
     
   
 # ROLE CHECK FUNCTIONS
 def is_admin(user):
-    return user.is_authenticated and hasattr(user, 'userprofile') and user.userprofile.role == 'Admin'
+    return get_role(user) == 'Admin'
 
 def is_librarian(user):
-    return user.is_authenticated and hasattr(user, 'userprofile') and user.userprofile.role == 'Librarian'
+    return get_role(user) == 'Librarian'
 
 def is_member(user):
-    return user.is_authenticated and hasattr(user, 'userprofile') and user.userprofile.role == 'Member'
+    return get_role(user) == 'Member'
 
 # ROLE-BASED VIEWS
 @user_passes_test(is_admin, login_url='/login/')
@@ -1,21 +1,25 @@
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django import forms
-from .models import Profile, Post, Comment, Tag
+from .models import Profile, Post, Comment
+from .search import index_post
+from .tags import normalize, set_post_tags
+from django.urls import reverse_lazy
 
 
 class PostForm(forms.ModelForm):
     tags_input = forms.CharField(
         required=False,
-        help_text='Enter tags separated by commas'
+        help_text='Enter tags separated by commas',
+        widget=forms.TextInput(attrs={
+            'autocomplete': 'off',
+            'data-autocomplete-url': reverse_lazy('tag-autocomplete'),
+        })
     )
     
     class Meta:
         model = Post
         fields = ['title', 'content']
-        widgets = {
-            'tags': TagWidget(),  # Use TagWidget for tags field
-        }
     
     
     def __init__(self, *args, **kwargs):
@@ -27,19 +31,16 @@ class PostForm(forms.ModelForm):
     
     def clean_tags_input(self):
         tags_input = self.cleaned_data.get('tags_input', '')
-        tags = [tag.strip() for tag in tags_input.split(',') if tag.strip()]
-        return tags
+        return normalize(tags_input.split(','))
     
     def save(self, commit=True):
         post = super().save(commit=False)
         if commit:
             post.save()
-            # Clear existing tags
-            post.tags.clear()
-            # Add new tags
-            for tag_name in self.cleaned_data['tags_input']:
-                tag, created = Tag.objects.get_or_create(name=tag_name)
-                post.tags.add(tag)
+            # Resolve all tags at once and write only the changed links
+            set_post_tags(post, self.cleaned_data['tags_input'])
+            # Keep the search index in step with the post and its tags
+            index_post(post, self.cleaned_data['tags_input'])
         return post
 
 
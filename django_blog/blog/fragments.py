@@ -0,0 +1,78 @@
+"""
+Cached HTML fragments for the post detail page.
+
+Every fragment key carries a version number kept per post and fragment.
+Editing the post bumps the 'body' version and creating, editing or
+deleting one of its comments bumps the 'comments' version (see
+signals.py), so the next request renders that fragment afresh and the
+stale copy expires on its own.
+
+Fragments hold nothing user-specific; per-user bits such as edit links
+are added by the page template around them.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_TIMEOUT = 60 * 60
+
+
+def _version_key(name, post_id):
+    return f'blog-fragment:{name}:{post_id}:version'
+
+
+def fragment_version(name, post_id):
+    # Start from the clock rather than 1, so a version key that was evicted
+    # can't come back as a number whose old fragments are still cached
+    return cache.get_or_set(_version_key(name, post_id), time.time_ns, None)
+
+
+def bump_version(name, post_id):
+    """Retire the cached `name` fragment of a post"""
+    try:
+        cache.incr(_version_key(name, post_id))
+    except ValueError:  # not set yet (or evicted)
+        cache.set(_version_key(name, post_id), time.time_ns(), None)
+
+
+class FragmentStats:
+    """Per-process hit/miss counts by fragment name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def record(self, name, hit):
+        with self._lock:
+            self.counts[(name, hit)] += 1
+            hits, misses = self.counts[(name, True)], self.counts[(name, False)]
+        return hits / (hits + misses)
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+
+stats = FragmentStats()
+
+
+def cached_fragment(name, post_id, render):
+    """
+    The `name` fragment of a post from cache, or `render()` stored under
+    its current version. Returns (fragment, hit).
+    """
+    key = f'blog-fragment:{name}:{post_id}:{fragment_version(name, post_id)}'
+    fragment = cache.get(key)
+    hit = fragment is not None
+    if not hit:
+        fragment = render()
+        cache.set(key, fragment, FRAGMENT_TIMEOUT)
+    hit_rate = stats.record(name, hit)
+    logger.debug('%s fragment for post %s: %s (hit rate %.0f%%)',
+                name, post_id, 'hit' if hit else 'miss', 100 * hit_rate)
+    return fragment, hit
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.search import index_post
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search term index for every post'
+
+    def handle(self, *args, **options):
+        count = 0
+        for post in Post.objects.prefetch_related('tags').iterator(chunk_size=500):
+            index_post(post, [tag.name for tag in post.tags.all()])
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} posts'))
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.urls import reverse
 
 
 class Tag(models.Model):
@@ -14,6 +15,15 @@ class Post(models.Model):
     published_date = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     tags = models.ManyToManyField(Tag, related_name='posts', blank=True)
+    
+    class Meta:
+        indexes = [
+            # Newest-first listings and their keyset "older posts" pages
+            models.Index(fields=['-published_date', '-id'], name='post_published_idx'),
+        ]
+    
+    def get_absolute_url(self):
+        return reverse('post-detail', kwargs={'pk': self.pk})
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -31,7 +41,30 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # A post's comments newest first, paged by (created_at, id)
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ]
+    
     def __str__(self):
         return f'Comment by {self.author} on {self.post.title}'
     
 
+
+
+class PostTerm(models.Model):
+    """
+    One row per (term, post) of the search index in blog/search.py.
+    Weight adds up title, content and tag occurrences of the term.
+    """
+    term = models.CharField(max_length=50)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='terms')
+    weight = models.PositiveIntegerField()
+    
+    class Meta:
+        # Also the index searches run on: exact terms and prefix ranges
+        unique_together = ('term', 'post')
+    
+    def __str__(self):
+        return f'{self.term} -> {self.post_id} ({self.weight})'
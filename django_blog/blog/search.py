@@ -0,0 +1,133 @@
+"""
+Blog search over a term index.
+
+Each post's title, content and tag names are tokenized into PostTerm
+rows (term, post, weight) when the post is saved through PostForm. A
+search looks up only the rows for its own terms, so its cost follows how
+many posts use those words rather than how many posts there are. The
+last word of a query is matched as a prefix, which also drives the
+typeahead endpoint.
+
+Results are cached under the normalized query. Any change to the index
+bumps a version number that is part of every key, which retires all
+cached results at once.
+"""
+import hashlib
+import re
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import PostTerm
+
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 5
+CONTENT_WEIGHT = 1
+
+RESULTS_LIMIT = 100
+CACHE_TIMEOUT = 300
+VERSION_KEY = 'blog-search:version'
+
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have i in is it its of on or '
+    'that the this to was were will with'.split()
+)
+WORD_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = PostTerm._meta.get_field('term').max_length
+
+
+def tokenize(text):
+    words = WORD_RE.findall(text.lower())
+    return [word[:MAX_TERM_LENGTH] for word in words if len(word) > 1 and word not in STOPWORDS]
+
+
+def post_terms(post, tag_names):
+    """Weighted terms of a post and its tags"""
+    weights = Counter()
+    for term in tokenize(post.content):
+        weights[term] += CONTENT_WEIGHT
+    for term in tokenize(post.title):
+        weights[term] += TITLE_WEIGHT
+    for name in tag_names:
+        for term in tokenize(name):
+            weights[term] += TAG_WEIGHT
+    return weights
+
+
+def starting_with(prefix):
+    """
+    Lookups for terms starting with `prefix` as a plain range, which every
+    backend serves from the (term, post) index. term__startswith compiles
+    to LIKE ... ESCAPE on SQLite, and SQLite scans the table for that.
+    """
+    return {'term__gte': prefix, 'term__lt': prefix + '\U0010ffff'}
+
+
+def _version():
+    # Seeded from the clock so an evicted version never comes back as an old number
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def bump_version():
+    """Retire every cached result"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # not set yet (or evicted)
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def index_post(post, tag_names=None):
+    """(Re)write the index rows of one post"""
+    if tag_names is None:
+        tag_names = post.tags.values_list('name', flat=True)
+    weights = post_terms(post, tag_names)
+    with transaction.atomic():
+        PostTerm.objects.filter(post=post).delete()
+        PostTerm.objects.bulk_create(
+            [PostTerm(term=term, post=post, weight=weight) for term, weight in weights.items()]
+        )
+    transaction.on_commit(bump_version)
+
+
+def search(query):
+    """Ids of posts matching `query`, best first"""
+    terms = tokenize(query)
+    if not terms:
+        return []
+    key = 'blog-search:%s:%s' % (_version(), hashlib.sha1(' '.join(terms).encode()).hexdigest())
+    post_ids = cache.get(key)
+    if post_ids is None:
+        *words, prefix = terms
+        matches = PostTerm.objects.filter(**starting_with(prefix))
+        if words:
+            matches = matches | PostTerm.objects.filter(term__in=words)
+        post_ids = list(
+            matches.values('post_id')
+            .annotate(score=Sum('weight'))
+            .order_by('-score', '-post_id')
+            .values_list('post_id', flat=True)[:RESULTS_LIMIT]
+        )
+        cache.set(key, post_ids, CACHE_TIMEOUT)
+    return post_ids
+
+
+def suggest(prefix, limit=10):
+    """Indexed terms starting with `prefix`, the most widely used first"""
+    terms = tokenize(prefix)
+    if not terms:
+        return []
+    key = 'blog-suggest:%s:%s:%s' % (_version(), limit, hashlib.sha1(terms[-1].encode()).hexdigest())
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = list(
+            PostTerm.objects.filter(**starting_with(terms[-1]))
+            .values('term')
+            .annotate(posts=Count('post'))
+            .order_by('-posts', 'term')
+            .values_list('term', flat=True)[:limit]
+        )
+        cache.set(key, suggestions, CACHE_TIMEOUT)
+    return suggestions
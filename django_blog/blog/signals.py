@@ -1,8 +1,11 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Profile
+from .models import Profile, Post, Tag, Comment
+from .search import bump_version
+from .tags import tag_cache
+from .fragments import bump_version as bump_fragment_version
 
 User = get_user_model()
 
@@ -14,3 +17,26 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+
+@receiver(post_delete, sender=Post)
+def drop_cached_search_results(sender, instance, **kwargs):
+    # The post's index rows go with it (on_delete=CASCADE); cached results may still list it
+    bump_version()
+
+
+@receiver(post_delete, sender=Tag)
+def forget_cached_tag(sender, instance, **kwargs):
+    tag_cache.discard(instance.name)
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_fragments(sender, instance, created, **kwargs):
+    if not created:
+        bump_fragment_version('body', instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def refresh_comment_fragments(sender, instance, **kwargs):
+    bump_fragment_version('comments', instance.post_id)
@@ -1,4 +1,64 @@
 // Basic example script to demonstrate dynamic behavior
 document.addEventListener('DOMContentLoaded', function() {
     console.log('Blog page loaded');
-});
\ No newline at end of file
+});
+// Tag autocomplete: suggest names for the word after the last comma
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-autocomplete-url]').forEach(function(input) {
+        var list = document.createElement('datalist');
+        list.id = input.id + '-suggestions';
+        input.after(list);
+        input.setAttribute('list', list.id);
+
+        input.addEventListener('input', function() {
+            var parts = input.value.split(',');
+            var prefix = parts.pop().trim();
+            var done = parts.length ? parts.join(',') + ', ' : '';
+            list.innerHTML = '';
+            if (!prefix) return;
+            fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(prefix))
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    data.tags.forEach(function(name) {
+                        var option = document.createElement('option');
+                        option.value = done + name;
+                        list.appendChild(option);
+                    });
+                });
+        });
+    });
+});
+
+// "Load more comments": append the next page of older comments
+document.addEventListener('DOMContentLoaded', function() {
+    var button = document.querySelector('.load-more-comments');
+    if (!button) return;
+    var list = document.getElementById('comments');
+
+    button.addEventListener('click', function() {
+        button.disabled = true;
+        fetch(button.dataset.url + '?before=' + encodeURIComponent(button.dataset.next))
+            .then(function(response) { return response.json(); })
+            .then(function(data) {
+                data.comments.forEach(function(comment) {
+                    var item = document.createElement('div');
+                    item.className = 'comment';
+                    item.innerHTML = comment.html;
+                    if (comment.edit_url) {
+                        var links = document.createElement('small');
+                        links.innerHTML = '<a href="' + comment.edit_url + '">Edit</a> ' +
+                                          '<a href="' + comment.delete_url + '">Delete</a>';
+                        item.appendChild(links);
+                    }
+                    list.appendChild(item);
+                    list.appendChild(document.createElement('hr'));
+                });
+                if (data.next) {
+                    button.dataset.next = data.next;
+                    button.disabled = false;
+                } else {
+                    button.remove();
+                }
+            });
+    });
+});
@@ -0,0 +1,124 @@
+"""
+Tag resolution for PostForm in a fixed number of queries.
+
+Names are normalized and looked up in an in-process name -> id cache.
+Only names the cache doesn't know are fetched, in one query, and any
+still missing are created with one conflict-ignoring bulk INSERT, so two
+writers adding the same new tag don't trip over each other. Then the
+post's through table is diffed, so a save writes only the rows it
+actually adds or removes.
+
+The same cache answers tag autocomplete. It is reloaded every
+CACHE_TIMEOUT seconds to pick up tags created by other processes.
+"""
+import bisect
+import re
+import threading
+import time
+
+from django.db import transaction
+
+from .models import Post, Tag
+
+CACHE_TIMEOUT = 300
+MAX_NAME_LENGTH = Tag._meta.get_field('name').max_length
+PostTag = Post.tags.through
+
+
+def normalize(names):
+    """Strip and collapse whitespace, drop blanks and repeats (first spelling wins)"""
+    seen = {}
+    for name in names:
+        name = re.sub(r'\s+', ' ', name).strip()[:MAX_NAME_LENGTH]
+        if name and name.lower() not in seen:
+            seen[name.lower()] = name
+    return list(seen.values())
+
+
+class TagCache:
+    """Every tag name -> id, plus the names sorted for prefix lookups"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = None
+        self._sorted = []
+        self._loaded_at = 0
+
+    def _load(self):
+        with self._lock:
+            if self._ids is not None and time.monotonic() - self._loaded_at < CACHE_TIMEOUT:
+                return
+            self._ids = dict(Tag.objects.values_list('name', 'id'))
+            self._sorted = sorted((name.lower(), name) for name in self._ids)
+            self._loaded_at = time.monotonic()
+
+    def get_ids(self, names):
+        self._load()
+        return {name: self._ids[name] for name in names if name in self._ids}
+
+    def add(self, ids_by_name):
+        self._load()
+        with self._lock:
+            for name, tag_id in ids_by_name.items():
+                if name not in self._ids:
+                    self._ids[name] = tag_id
+                    bisect.insort(self._sorted, (name.lower(), name))
+
+    def discard(self, name):
+        with self._lock:
+            if self._ids is not None and self._ids.pop(name, None) is not None:
+                self._sorted.remove((name.lower(), name))
+
+    def clear(self):
+        with self._lock:
+            self._ids = None
+            self._sorted = []
+
+    def complete(self, prefix, limit=10):
+        """Tag names starting with `prefix` (case-insensitive), alphabetically"""
+        self._load()
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._sorted, (prefix,))
+            matches = []
+            for lowered, name in self._sorted[start:]:
+                if not lowered.startswith(prefix) or len(matches) == limit:
+                    break
+                matches.append(name)
+        return matches
+
+
+tag_cache = TagCache()
+
+
+def resolve_tags(names):
+    """Ids of the tags called `names`, creating any that don't exist"""
+    ids = tag_cache.get_ids(names)
+    missing = [name for name in names if name not in ids]
+    if missing:
+        found = dict(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+        new = [name for name in missing if name not in found]
+        if new:
+            Tag.objects.bulk_create([Tag(name=name) for name in new], ignore_conflicts=True)
+            # ignore_conflicts leaves pks unset, so read back what is there now
+            found.update(Tag.objects.filter(name__in=new).values_list('name', 'id'))
+        tag_cache.add(found)
+        ids.update(found)
+    return [ids[name] for name in names]
+
+
+def set_post_tags(post, names):
+    """Make `post`'s tags exactly `names`, touching only the rows that change"""
+    wanted = set(resolve_tags(names))
+    with transaction.atomic():
+        current = set(PostTag.objects.filter(post=post).values_list('tag_id', flat=True))
+        removed = current - wanted
+        if removed:
+            PostTag.objects.filter(post=post, tag_id__in=removed).delete()
+        added = wanted - current
+        if added:
+            PostTag.objects.bulk_create(
+                [PostTag(post=post, tag_id=tag_id) for tag_id in added], ignore_conflicts=True
+            )
@@ -1,3 +1,266 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .forms import PostForm
+from .fragments import stats as fragment_stats
+from .models import Comment, Post, PostTerm, Tag
+from .search import search, suggest
+from .tags import tag_cache
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+
+    def create(self, title, content, tags=''):
+        form = PostForm(data={'title': title, 'content': content, 'tags_input': tags})
+        form.instance.author = self.author
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            return form.save()
+
+    def titles(self, query):
+        response = self.client.get(reverse('search'), {'query': query})
+        return [post.title for post in response.context['posts']]
+
+    def test_tags_outrank_body_mentions(self):
+        self.create('Weekend notes', 'Some django tips.')
+        self.create('Forms', 'Nothing here.', tags='Django, python')
+        self.create('Cooking', 'Bread.')
+        self.assertEqual(self.titles('django'), ['Forms', 'Weekend notes'])
+
+    def test_last_word_matches_as_prefix(self):
+        self.create('Deploying Django', 'with gunicorn')
+        self.assertEqual(self.titles('deploying djan'), ['Deploying Django'])
+        response = self.client.get(reverse('search-suggest'), {'q': 'gun'})
+        self.assertEqual(response.json(), {'suggestions': ['gunicorn']})
+
+    def test_edits_and_deletes_reach_cached_results(self):
+        post = self.create('Draft', 'about cats')
+        self.assertEqual(search('cats'), [post.pk])
+        form = PostForm(data={'title': 'Draft', 'content': 'about dogs', 'tags_input': ''}, instance=post)
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+        self.assertEqual(search('cats'), [])
+        self.assertEqual(search('dogs'), [post.pk])
+        post.delete()
+        self.assertFalse(PostTerm.objects.exists())
+        self.assertEqual(self.titles('dogs'), [])
+
+    def test_repeat_search_is_served_from_cache(self):
+        self.create('Caching', 'results by normalized query')
+        search('Caching  RESULTS')
+        with self.assertNumQueries(0):
+            search('caching results')
+
+
+    def test_prefix_lookups_use_the_term_index(self):
+        self.create('Deploying Django', 'with gunicorn')
+        for run in (lambda: search('deploying djan'), lambda: suggest('gun')):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                run()
+            sql = [query['sql'] for query in queries if 'blog_postterm' in query['sql']]
+            self.assertTrue(sql)
+            for statement in sql:
+                with connection.cursor() as cursor:
+                    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+                    cursor.execute(prefix + statement)
+                    plan = ' '.join(' '.join(map(str, row)) for row in cursor.fetchall())
+                self.assertIn('INDEX', plan.upper(), plan)
+                self.assertNotIn('SCAN blog_postterm', plan, plan)
+
+class PostListingTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.tag = Tag.objects.create(name='django')
+        self.posts = [Post.objects.create(title=f'Post {i}', content='...', author=self.author) for i in range(25)]
+        for post in self.posts[::2]:
+            post.tags.add(self.tag)
+
+    def walk(self, url):
+        """Follow "older posts" links; returns the titles of each page"""
+        pages, params = [], {}
+        while True:
+            response = self.client.get(url, params)
+            pages.append([post.title for post in response.context['posts']])
+            cursor = response.context['older_cursor']
+            if cursor is None:
+                return pages
+            params = {'before': cursor}
+
+    def test_older_posts_walks_every_post_once(self):
+        pages = self.walk(reverse('post-list'))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), [f'Post {i}' for i in reversed(range(25))])
+
+    def test_page_queries_do_not_grow_with_rows(self):
+        # session/user lookups aside: posts with authors, and their tags
+        with self.assertNumQueries(2):
+            self.client.get(reverse('post-list'))
+        with self.assertNumQueries(3):  # plus the cursor row
+            self.client.get(reverse('post-list'), {'before': self.posts[15].pk})
+
+    def test_tag_view_pages_tagged_posts(self):
+        pages = self.walk(reverse('tag-posts', args=['django']))
+        self.assertEqual([len(page) for page in pages], [10, 3])
+        response = self.client.get(reverse('tag-posts', args=['missing']))
+        self.assertEqual(list(response.context['posts']), [])
+
+    def test_tags_with_slashes_and_reserved_names_route(self):
+        post = Post.objects.create(title='Pipelines', content='...', author=self.author)
+        post.tags.add(Tag.objects.create(name='CI/CD'), Tag.objects.create(name='autocomplete'))
+        self.assertEqual(self.client.get(reverse('post-list')).status_code, 200)
+        for name in ('CI/CD', 'autocomplete'):
+            response = self.client.get(reverse('tag-posts', args=[name]))
+            self.assertEqual(list(response.context['posts']), [post])
+
+
+class TagPersistenceTestCase(TestCase):
+
+    def setUp(self):
+        tag_cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        Tag.objects.create(name='python')
+
+    def save(self, tags, instance=None):
+        form = PostForm(data={'title': 'Post', 'content': '...', 'tags_input': tags}, instance=instance)
+        form.instance.author = self.author
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def tag_names(self, post):
+        return sorted(post.tags.values_list('name', flat=True))
+
+    def test_names_are_normalized_and_created_once(self):
+        post = self.save(' python ,  web   dev, Python, , web dev')
+        self.assertEqual(self.tag_names(post), ['python', 'web dev'])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def queries_to_save(self, tags, post):
+        with CaptureQueriesContext(connection) as queries:
+            self.save(tags, instance=post)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_tag_count(self):
+        post = self.save('python')
+        few = self.queries_to_save('new1, new2', post)
+        many = self.queries_to_save(', '.join(f'tag{i}' for i in range(20)), post)
+        self.assertEqual(few, many)
+        self.assertEqual(len(self.tag_names(post)), 20)
+
+    def test_only_changed_links_are_written(self):
+        post = self.save('python, django')
+        with CaptureQueriesContext(connection) as queries:
+            self.save('python, django, web', instance=post)
+        link_writes = [q['sql'] for q in queries if 'blog_post_tags' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(len(link_writes), 1)
+        self.assertIn('INSERT', link_writes[0])
+        self.assertEqual(self.tag_names(post), ['django', 'python', 'web'])
+        self.save('web', instance=post)
+        self.assertEqual(self.tag_names(post), ['web'])
+
+    def test_autocomplete_from_cache(self):
+        self.save('Django, django-rest, web')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('tag-autocomplete'), {'q': 'DJ'})
+        self.assertEqual(response.json(), {'tags': ['Django', 'django-rest']})
+
+
+class PostDetailCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        fragment_stats.reset()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.post = Post.objects.create(title='Hello', content='First post', author=self.author)
+        self.url = reverse('post-detail', args=[self.post.pk])
+
+    def get(self):
+        with self.assertLogs('blog.fragments', 'DEBUG') as logs:
+            response = self.client.get(self.url)
+        return response, [line.split(': ')[-1].split(' ')[0] for line in logs.output]
+
+    def test_second_view_is_served_from_cache(self):
+        Comment.objects.create(post=self.post, author=self.reader, content='Nice')
+        self.assertEqual(self.get()[1], ['miss', 'miss'])
+        with self.assertNumQueries(1):  # just the post itself
+            self.client.get(self.url)
+        self.assertEqual(fragment_stats.counts[('comments', True)], 1)
+
+    def test_comment_changes_and_post_edits_invalidate(self):
+        self.get()
+        self.client.force_login(self.reader)
+        self.client.post(reverse('comment-create', args=[self.post.pk]), {'content': 'Great read'})
+        response, outcomes = self.get()
+        self.assertEqual(outcomes, ['hit', 'miss'])
+        self.assertContains(response, 'Great read')
+
+        comment = Comment.objects.get()
+        self.client.post(reverse('comment-update', args=[comment.pk]), {'content': 'Edited'})
+        self.assertContains(self.get()[0], 'Edited')
+        self.client.post(reverse('comment-delete', args=[comment.pk]))
+        self.assertNotContains(self.get()[0], 'Edited')
+
+    def test_invalid_comment_shows_errors(self):
+        self.client.force_login(self.reader)
+        response = self.client.post(reverse('comment-create', args=[self.post.pk]), {'content': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'This field is required.')
+        self.assertContains(response, self.post.title)
+        self.assertFalse(Comment.objects.exists())
+
+        self.client.force_login(self.author)
+        self.client.post(reverse('post-update', args=[self.post.pk]), {'title': 'Hello', 'content': 'Rewritten'})
+        self.assertContains(self.get()[0], 'Rewritten')
+
+    def test_edit_links_are_per_user(self):
+        comment = Comment.objects.create(post=self.post, author=self.reader, content='Mine')
+        edit_url = reverse('comment-update', args=[comment.pk])
+        self.client.force_login(self.author)
+        self.assertNotContains(self.client.get(self.url), edit_url)
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(self.url), edit_url)
+
+
+class CommentPaginationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.post = Post.objects.create(title='Busy', content='...', author=self.author)
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, content=f'Comment {i}') for i in range(45)
+        ])
+
+    def test_page_shows_newest_and_load_more_walks_the_rest(self):
+        response = self.client.get(reverse('post-detail', args=[self.post.pk]))
+        self.assertContains(response, 'Comments (45)')
+        self.assertContains(response, '<strong>author</strong>')  # cached HTML is not re-escaped
+        comments = response.context['comments']
+        self.assertEqual(len(comments['items']), 20)
+
+        seen = [item['pk'] for item in comments['items']]
+        cursor = comments['next']
+        while cursor:
+            data = self.client.get(reverse('comment-page', args=[self.post.pk]), {'before': cursor}).json()
+            seen += [comment['id'] for comment in data['comments']]
+            cursor = data['next']
+        expected = list(self.post.comments.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_edit_links_only_for_the_author(self):
+        url = reverse('comment-page', args=[self.post.pk])
+        self.assertIsNone(self.client.get(url).json()['comments'][0]['edit_url'])
+        self.client.force_login(self.author)
+        self.assertIsNotNone(self.client.get(url).json()['comments'][0]['edit_url'])
+        self.assertEqual(self.client.get(reverse('comment-page', args=[999])).status_code, 404)
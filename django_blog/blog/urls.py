@@ -17,10 +17,14 @@ urlpatterns = [
     
     # Comment URLs
     path('post/<int:pk>/comments/new/', views.CommentCreateView.as_view(), name='comment-create'),
+    path('post/<int:pk>/comments/', views.comment_page_json, name='comment-page'),
     path('comment/<int:pk>/update/', views.CommentUpdateView.as_view(), name='comment-update'),
     path('comment/<int:pk>/delete/', views.CommentDeleteView.as_view(), name='comment-delete'),
     
     # Search and Tag URLs
     path('search/', views.SearchView.as_view(), name='search'),
-    path('tags/<slug:tag_slug>/',PostByTagListView.as_view(), name='tag-posts'),
+    path('search/suggest/', views.search_suggestions, name='search-suggest'),
+    path('autocomplete/tags/', views.tag_autocomplete, name='tag-autocomplete'),
+    # path: because tag names may contain '/' (e.g. "CI/CD")
+    path('tags/<path:tag_name>/', views.TagView.as_view(), name='tag-posts'),
 ]
\ No newline at end of file
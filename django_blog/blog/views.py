@@ -2,15 +2,20 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView, TemplateView, DetailView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from .forms import CustomUserCreationForm, UserProfileUpdateForm, ProfileForm, PostForm, CommentForm
 from django.contrib.auth.models import User
-from .models import Profile, Post, Comment
+from .models import Profile, Post, Comment, Tag
 from django.views import View
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from .forms import SearchForm
+from .search import search, suggest
+from .tags import tag_cache
+from .fragments import cached_fragment
+from django.template.loader import render_to_string
+from django.http import JsonResponse
 
 class RegisterView(CreateView):
     form_class = CustomUserCreationForm
@@ -46,12 +51,57 @@ class ProfileUpdateView(LoginRequiredMixin, View):
         
         
 
+def older_than(queryset, date_field, before):
+    """
+    Rows of `queryset` that come after row `before` in newest-first
+    (date_field, id) order; unknown or malformed cursors are ignored.
+    """
+    if not (before and str(before).isdigit()):
+        return queryset
+    cursor = queryset.filter(pk=before).values_list(date_field, 'pk').first()
+    if cursor is None:
+        return queryset
+    date, pk = cursor
+    return queryset.filter(Q(**{f'{date_field}__lt': date}) | Q(**{date_field: date, 'pk__lt': pk}))
+
+
+def keyset_page(queryset, date_field, size):
+    """The first `size` rows newest first, and the cursor for the next page (or None)"""
+    rows = list(queryset.order_by(f'-{date_field}', '-id')[:size + 1])
+    # The extra row only tells whether an older page exists
+    return rows[:size], rows[size - 1].pk if len(rows) > size else None
+
+
+class OlderPostsMixin:
+    """
+    Keyset pagination for newest-first post listings: ?before=<post id>
+    shows the posts published before that one. Every page is one range
+    scan on post_published_idx, however far back it is.
+    """
+    posts_per_page = 10
+    
+    def paginate_posts(self, queryset):
+        queryset = older_than(queryset, 'published_date', self.request.GET.get('before'))
+        posts, self.older_cursor = keyset_page(
+            queryset.select_related('author').prefetch_related('tags'), 'published_date', self.posts_per_page
+        )
+        return posts
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['older_cursor'] = self.older_cursor
+        context['is_first_page'] = not self.request.GET.get('before')
+        return context
+
+
 # Post List View (accessible to all)
-class PostListView(ListView):
+class PostListView(OlderPostsMixin, ListView):
     model = Post
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
-    ordering = ['-published_date']
+    
+    def get_queryset(self):
+        return self.paginate_posts(Post.objects.all())
 
 # Post Detail View (accessible to all)
 class PostDetailView(DetailView):
@@ -60,10 +110,59 @@ class PostDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['comments'] = self.object.comments.all().order_by('-created_at')
-        context['comment_form'] = CommentForm()
+        post = self.object
+        context['post_body'], _ = cached_fragment(
+            'body', post.pk, lambda: render_to_string('blog/_post_body.html', {'post': post})
+        )
+        # First page only; older comments come from comment_page_json
+        context['comments'], _ = cached_fragment('comments', post.pk, lambda: {
+            **comment_page(post.pk),
+            'count': post.comments.count(),
+        })
+        # CommentCreateView passes in a bound form when it needs re-showing
+        context.setdefault('comment_form', CommentForm())
         return context
 
+COMMENTS_PER_PAGE = 20
+
+
+def comment_page(post_id, before=None):
+    """A page of a post's comments, newest first, rendered, with the next page's cursor"""
+    comments = older_than(Comment.objects.filter(post_id=post_id), 'created_at', before)
+    comments, older = keyset_page(comments.select_related('author'), 'created_at', COMMENTS_PER_PAGE)
+    return {
+        'items': [
+            {
+                'pk': comment.pk,
+                'author_id': comment.author_id,
+                'html': render_to_string('blog/_comment.html', {'comment': comment}),
+            }
+            for comment in comments
+        ],
+        'next': older,
+    }
+
+
+def comment_page_json(request, pk):
+    """"Load more comments": ?before=<comment id> -> the next page as JSON"""
+    if not Post.objects.filter(pk=pk).exists():
+        return JsonResponse({'error': 'Post not found'}, status=404)
+    page = comment_page(pk, request.GET.get('before'))
+    user_id = request.user.pk if request.user.is_authenticated else None
+    return JsonResponse({
+        'comments': [
+            {
+                'id': item['pk'],
+                'html': item['html'],
+                # Links only for the comment's author, as on the page itself
+                'edit_url': reverse('comment-update', args=[item['pk']]) if item['author_id'] == user_id else None,
+                'delete_url': reverse('comment-delete', args=[item['pk']]) if item['author_id'] == user_id else None,
+            }
+            for item in page['items']
+        ],
+        'next': page['next'],
+    })
+
 # Create Post View (only authenticated users)
 class PostCreateView(LoginRequiredMixin, CreateView):
     model = Post
@@ -102,11 +201,17 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
     
     def form_valid(self, form):
         form.instance.author = self.request.user
-        form.instance.post = get_object_or_404(Post, pk=self.kwargs['post_id'])
+        form.instance.post = get_object_or_404(Post, pk=self.kwargs['pk'])
         return super().form_valid(form)
     
+    def form_invalid(self, form):
+        # Show the post again, with the submitted form and its errors
+        detail = PostDetailView(request=self.request, args=self.args, kwargs=self.kwargs)
+        detail.object = get_object_or_404(Post, pk=self.kwargs['pk'])
+        return detail.render_to_response(detail.get_context_data(object=detail.object, comment_form=form))
+    
     def get_success_url(self):
-        return reverse_lazy('post-detail', kwargs={'pk': self.kwargs['post_id']})
+        return reverse_lazy('post-detail', kwargs={'pk': self.kwargs['pk']})
 
 class CommentUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     model = Comment
@@ -140,31 +245,42 @@ class SearchView(ListView):
     
     def get_queryset(self):
         query = self.request.GET.get('query', '')
-        if query:
-            # Search in title, content, and tags
-            return Post.objects.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(tags__name__icontains=query)
-            ).distinct().order_by('-published_date')
-        return Post.objects.none()
+        post_ids = search(query)
+        if not post_ids:
+            return []
+        # Search title, content and tags through the term index, best match first
+        posts = Post.objects.select_related('author').prefetch_related('tags').in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['query'] = self.request.GET.get('query', '')
         return context
 
+def search_suggestions(request):
+    """Typeahead for the search box: ?q=<partial word> -> matching index terms"""
+    return JsonResponse({'suggestions': suggest(request.GET.get('q', ''))})
+
+def tag_autocomplete(request):
+    """Tag names for the post form: ?q=<prefix>, served from the in-process tag cache"""
+    return JsonResponse({'tags': tag_cache.complete(request.GET.get('q', ''))})
+
 # Add Tag View
-class TagView(ListView):
+class TagView(OlderPostsMixin, ListView):
     model = Post
     template_name = 'blog/tag_posts.html'
     context_object_name = 'posts'
     
     def get_queryset(self):
-        tag_name = self.kwargs['tag_name']
-        return Post.objects.filter(tags__name=tag_name).order_by('-published_date')
+        # Resolve the tag through its unique name index, then walk the
+        # through table by tag_id instead of joining on tags__name
+        tag = Tag.objects.filter(name=self.kwargs['tag_name']).first()
+        if tag is None:
+            self.older_cursor = None
+            return []
+        return self.paginate_posts(Post.objects.filter(tags=tag))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['tag_name'] = self.kwargs['tag_name']
-        return context
\ No newline at end of file
+        return context
@@ -130,3 +130,17 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Post detail fragment cache hits/misses (blog/fragments.py)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Per-request hit/miss lines are DEBUG; set 'DEBUG' here to see them
+        'blog.fragments': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .tokens import check_revocation_store
+        # Checks don't run under a WSGI server, so refuse to start here as well
+        check_revocation_store()
@@ -0,0 +1,183 @@
+"""
+Token authentication that doesn't query the database on every request.
+
+Token -> user lookups (and user id -> user lookups for the signed tokens
+in accounts/tokens.py) are kept in two layers: a small in-process LRU
+with a short TTL, and the Django cache behind it. Only a miss in both
+runs a query. Entries are dropped explicitly on logout, when a token is
+deleted and whenever the user row is saved (deactivation, profile edits);
+another process may keep serving its local copy for up to LOCAL_TIMEOUT
+seconds.
+
+That bound only holds if the Django cache is shared by every process
+(Redis, set through REDIS_URL). With a per-process cache such as the default
+LocMemCache, other workers keep their copy for up to TIMEOUT seconds;
+check accounts.W001 warns about that.
+
+Configured through the TOKEN_AUTH_CACHE setting:
+
+    TOKEN_AUTH_CACHE = {
+        'TIMEOUT': 300,        # seconds in the Django cache
+        'LOCAL_TIMEOUT': 10,   # seconds in the in-process LRU, 0 turns it off
+        'LOCAL_SIZE': 1000,    # entries kept in the in-process LRU
+    }
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+DEFAULTS = {
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 10,
+    'LOCAL_SIZE': 1000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+def _cache_key(key):
+    # Raw tokens are credentials, so only their digest goes into a shared cache
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class LocalLRU:
+    """Thread-safe LRU of (value, expiry) pairs"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, max_size):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class AuthCacheStats:
+    """Per-process hit/miss counters and time spent authenticating"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.local_hits = self.shared_hits = self.misses = 0
+            self.total_seconds = 0.0
+
+    def record(self, outcome, seconds):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.total_seconds += seconds
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            return {
+                'lookups': lookups,
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+                'avg_latency_ms': 1000 * self.total_seconds / lookups if lookups else 0.0,
+            }
+
+
+local_cache = LocalLRU()
+stats = AuthCacheStats()
+
+
+def _cached(cache_key, load):
+    """Look `cache_key` up in the local LRU, then the Django cache, then `load()`"""
+    started = time.perf_counter()
+    config = get_config()
+    value = local_cache.get(cache_key) if config['LOCAL_TIMEOUT'] else None
+    if value is not None:
+        outcome = 'local_hits'
+    else:
+        value = cache.get(cache_key)
+        if value is not None:
+            outcome = 'shared_hits'
+        else:
+            outcome = 'misses'
+            value = load()
+            cache.set(cache_key, value, config['TIMEOUT'])
+        if config['LOCAL_TIMEOUT']:
+            local_cache.set(cache_key, value, config['LOCAL_TIMEOUT'], config['LOCAL_SIZE'])
+    # Each request gets its own instances; the cached ones are shared
+    value = copy.deepcopy(value)
+    stats.record(outcome, time.perf_counter() - started)
+    return value
+
+
+def _user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def cached_user(user_id):
+    """The user with `user_id` (active or not), or AuthenticationFailed if it is gone"""
+    def load():
+        try:
+            return get_user_model().objects.get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    return _cached(_user_key(user_id), load)
+
+
+def invalidate_token(key):
+    """Forget a cached token, e.g. on logout"""
+    cache_key = _cache_key(key)
+    local_cache.delete(cache_key)
+    cache.delete(cache_key)
+
+
+def invalidate_user(user_id):
+    """Forget the cached user and every cached token belonging to them"""
+    local_cache.delete(_user_key(user_id))
+    cache.delete(_user_key(user_id))
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication with token -> user lookups served from cache"""
+
+    def authenticate_credentials(self, key):
+        # DRF's lookup raises AuthenticationFailed for unknown tokens and inactive users
+        lookup = super().authenticate_credentials
+        token = _cached(_cache_key(key), lambda: lookup(key)[1])
+        return (token.user, token)
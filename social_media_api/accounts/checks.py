@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+# Backends that keep entries in the memory of one process
+PER_PROCESS_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PER_PROCESS_CACHES:
+        return [Warning(
+            'The default cache is per-process, so logout, deactivation and follow '
+            'invalidations only reach the worker that made them.',
+            hint='Point CACHES["default"] at a shared backend such as Redis.',
+            id='accounts.W001',
+        )]
+    return []
+
+
+@register()
+def revocation_store_check(app_configs, **kwargs):
+    from .tokens import revocation_store_problem, signed_tokens_enabled
+    if signed_tokens_enabled():
+        problem = revocation_store_problem()
+        if problem:
+            return [Error(
+                f'SIGNED_TOKENS is enabled but {problem}',
+                hint='Add a Redis cache alias, on a server with maxmemory-policy noeviction.',
+                id='accounts.E001',
+            )]
+    return []
@@ -0,0 +1,157 @@
+"""
+Follow graph over CustomUser.following.
+
+Each user's following and follower ids are cached as sets, so checking
+whether A follows B is a set lookup rather than a query. The sets live in
+the shared default cache, so an invalidation reaches every worker. Every follow
+and unfollow goes through this module, which keeps the follow counters,
+the cached sets, home timelines and notifications in step.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from notifications.dispatch import notify
+from posts.timeline import add_author_to_timeline, remove_author_from_timeline
+from social_media_api.counters import increment, decrement
+from social_media_api.db import insert_ignore
+
+User = get_user_model()
+Follow = User.following.through
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def _key(kind, user_id):
+    return f'follow-graph:{kind}:{user_id}'
+
+
+def _cached_ids(kind, user_id, lookup, column):
+    key = _key(kind, user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Follow.objects.filter(**{lookup: user_id}).values_list(column, flat=True))
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def following_ids(user_id):
+    """Ids of the users `user_id` follows"""
+    return _cached_ids('following', user_id, 'from_customuser_id', 'to_customuser_id')
+
+
+def follower_ids(user_id):
+    """Ids of the users following `user_id`"""
+    return _cached_ids('followers', user_id, 'to_customuser_id', 'from_customuser_id')
+
+
+def is_following(user_id, target_id):
+    return target_id in following_ids(user_id)
+
+
+def mutual_ids(user_id):
+    """Ids of users who follow `user_id` and are followed back"""
+    return following_ids(user_id) & follower_ids(user_id)
+
+
+def invalidate(follower_id, *target_ids):
+    """Drop cached sets touched by `follower_id` (un)following `target_ids`"""
+    keys = [_key('following', follower_id)]
+    keys += [_key('followers', target_id) for target_id in target_ids]
+    # Once now and again after commit, so a reader can't re-cache the old
+    # sets while the transaction is still open
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _lock_follower(user_id):
+    """
+    Serialize `user_id`'s follow writes on their own user row, so the
+    Follow rows a transaction reads stay the ones that exist until it
+    commits and the counters move by what was really inserted or deleted.
+    """
+    list(User.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+
+
+def _followed_among(user_id, target_ids):
+    return set(
+        Follow.objects.filter(from_customuser_id=user_id, to_customuser_id__in=target_ids)
+        .values_list('to_customuser_id', flat=True)
+    )
+
+
+def follow(user, target):
+    """Make `user` follow `target`; returns False if they already did"""
+    if user.pk == target.pk:
+        raise ValueError('Cannot follow yourself')
+    with transaction.atomic():
+        _lock_follower(user.pk)
+        created = insert_ignore(Follow, from_customuser_id=user.pk, to_customuser_id=target.pk)
+        if created:
+            increment(User, user.pk, 'following_count')
+            increment(User, target.pk, 'followers_count')
+            invalidate(user.pk, target.pk)
+    if created:
+        add_author_to_timeline(user, target)
+        # Target the followed user so new followers aggregate into one notification
+        notify(target.pk, user.pk, "started following you", User, target.pk)
+    return created
+
+
+def unfollow(user, target):
+    """Make `user` stop following `target`; returns False if they didn't"""
+    with transaction.atomic():
+        _lock_follower(user.pk)
+        deleted, _ = Follow.objects.filter(from_customuser_id=user.pk, to_customuser_id=target.pk).delete()
+        if deleted:
+            decrement(User, user.pk, 'following_count')
+            decrement(User, target.pk, 'followers_count')
+            invalidate(user.pk, target.pk)
+    if deleted:
+        remove_author_from_timeline(user, target)
+    return bool(deleted)
+
+
+def bulk_follow(user, targets):
+    """Follow several users at once; returns the ones that are new"""
+    targets = list({t.pk: t for t in targets if t.pk != user.pk}.values())
+    if not targets:
+        return []
+    with transaction.atomic():
+        # Not the cached sets: they can be stale, and counting a follow that
+        # already exists (or one another request just made) drifts the counters
+        _lock_follower(user.pk)
+        already = _followed_among(user.pk, [t.pk for t in targets])
+        new = [t for t in targets if t.pk not in already]
+        if new:
+            Follow.objects.bulk_create(
+                [Follow(from_customuser_id=user.pk, to_customuser_id=t.pk) for t in new],
+                ignore_conflicts=True
+            )
+            increment(User, user.pk, 'following_count', by=len(new))
+            User.objects.filter(pk__in=[t.pk for t in new]).update(followers_count=F('followers_count') + 1)
+            invalidate(user.pk, *[t.pk for t in new])
+    for target in new:
+        add_author_to_timeline(user, target)
+        notify(target.pk, user.pk, "started following you", User, target.pk)
+    return new
+
+
+def bulk_unfollow(user, targets):
+    """Unfollow several users at once; returns the ones that were followed"""
+    targets = list({t.pk: t for t in targets}.values())
+    if not targets:
+        return []
+    with transaction.atomic():
+        _lock_follower(user.pk)
+        ids = _followed_among(user.pk, [t.pk for t in targets])
+        followed = [t for t in targets if t.pk in ids]
+        if followed:
+            Follow.objects.filter(from_customuser_id=user.pk, to_customuser_id__in=ids).delete()
+            decrement(User, user.pk, 'following_count', by=len(ids))
+            User.objects.filter(pk__in=ids, followers_count__gt=0).update(followers_count=F('followers_count') - 1)
+            invalidate(user.pk, *ids)
+    for target in followed:
+        remove_author_from_timeline(user, target)
+    return followed
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.recommendations import DEFAULT_CHUNK_SIZE, DEFAULT_HUB_FOLLOWERS, DEFAULT_TOP_K, build_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute "who to follow" suggestions for every user from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K,
+                            help='Suggestions kept per user')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Users scored per sparse matrix product')
+        parser.add_argument('--hub-followers', type=int, default=DEFAULT_HUB_FOLLOWERS,
+                            help='Accounts with more followers are left out of co-follower scores')
+
+    def handle(self, *args, **options):
+        try:
+            import numpy, scipy  # noqa: F401
+        except ImportError:
+            raise CommandError('build_follow_suggestions needs numpy and scipy: pip install numpy scipy')
+        started = time.monotonic()
+        written = build_suggestions(options['top_k'], options['chunk_size'], options['hub_followers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} suggestions in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+from social_media_api.counters import backfill, count_of
+
+
+def backfill_follow_counters(apps, schema_editor):
+    """Start the new counters from the rows that already exist"""
+    User = apps.get_model('accounts', 'CustomUser')
+    Follow = User.following.through
+    backfill(User, {
+        'followers_count': count_of(Follow.objects.all(), 'to_customuser'),
+        'following_count': count_of(Follow.objects.all(), 'from_customuser'),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_follow_counters, migrations.RunPython.noop),
+    ]
@@ -10,12 +10,29 @@ class CustomUser(AbstractUser):
         related_name='followers',
         blank=True
     )
+    # Denormalized counts, kept in step with `following` by the follow views
+    # (see reconcile_counters for repairing drift)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return self.username
+
+class FollowSuggestion(models.Model):
+    """
+    Precomputed "who to follow" row, rebuilt offline by
+    `manage.py build_follow_suggestions`. Read back per user in rank order.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='follow_suggestions')
+    candidate = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    # How many of the accounts `user` follows already follow `candidate`
+    mutual_count = models.PositiveIntegerField(default=0)
     
-    def followers_count(self):
-        return self.followers.count()
+    class Meta:
+        unique_together = ('user', 'rank')
+        ordering = ['rank']
     
-    def following_count(self):
-        return self.following.count()
\ No newline at end of file
+    def __str__(self):
+        return f"{self.user} -> {self.candidate} (#{self.rank})"
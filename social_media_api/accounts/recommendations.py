@@ -0,0 +1,156 @@
+"""
+"Who to follow" suggestions, computed offline over the whole follow graph.
+
+The graph is loaded once into a sparse adjacency matrix A (A[i, j] = 1
+when user i follows user j). For a block of users, two products give
+every candidate score at once:
+
+    friends of friends   A @ A          how many people i follows follow k
+    co-followers         (A @ A.T) @ A  how often users following the same
+                                        accounts as i follow k
+
+Everyone who follows a hub (an account with millions of followers) is a
+co-follower of everyone else who does, which would make the rows of
+A @ A.T dense. The co-follower product therefore leaves out accounts with
+more than `hub_followers` followers; being followed along with such an
+account says little about taste anyway.
+
+Users i already follows, i itself and inactive accounts are masked out,
+and the top `top_k` candidates per user replace that user's rows in
+FollowSuggestion. numpy and scipy are only needed here, by the batch job.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import FollowSuggestion
+
+User = get_user_model()
+Follow = User.following.through
+
+FRIEND_OF_FRIEND_WEIGHT = 1.0
+# Co-follower paths are one hop longer and far more numerous, so they
+# mostly break ties between friend-of-friend candidates
+CO_FOLLOWER_WEIGHT = 0.1
+
+DEFAULT_TOP_K = 20
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_HUB_FOLLOWERS = 1000
+
+
+def load_graph():
+    """Return (user ids, active mask, CSR adjacency matrix) for the whole graph"""
+    import numpy as np
+    from scipy import sparse
+
+    users = list(User.objects.order_by('pk').values_list('pk', 'is_active'))
+    user_ids = np.array([pk for pk, _ in users], dtype=np.int64)
+    active = np.array([is_active for _, is_active in users], dtype=bool)
+
+    edges = Follow.objects.values_list('from_customuser_id', 'to_customuser_id')
+    pairs = np.fromiter(
+        (id_ for edge in edges.iterator(chunk_size=10000) for id_ in edge),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    rows = np.searchsorted(user_ids, pairs[:, 0])
+    cols = np.searchsorted(user_ids, pairs[:, 1])
+    n = len(user_ids)
+    adjacency = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, cols)), shape=(n, n)
+    )
+    return user_ids, active, adjacency
+
+
+def without_hubs(adjacency, hub_followers):
+    """`adjacency` minus the columns of accounts with more than `hub_followers` followers"""
+    import numpy as np
+    from scipy import sparse
+
+    followers = np.asarray(adjacency.sum(axis=0)).ravel()
+    keep = sparse.diags((followers <= hub_followers).astype(np.float32))
+    shared = (adjacency @ keep).tocsr()
+    shared.eliminate_zeros()
+    return shared
+
+
+def score_block(adjacency, shared, shared_t, start, stop, active):
+    """
+    Candidate scores and friend-of-friend counts for users start..stop-1.
+    `shared` is without_hubs(adjacency) and `shared_t` its transpose.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    block = adjacency[start:stop]
+    friends_of_friends = (block @ adjacency).tocsr()
+    # Each row has at most (accounts followed) * hub_followers entries
+    co_followers = (shared[start:stop] @ shared_t) @ adjacency
+    scores = FRIEND_OF_FRIEND_WEIGHT * friends_of_friends + CO_FOLLOWER_WEIGHT * co_followers
+
+    # Drop users already followed, the user themselves and inactive accounts
+    size = stop - start
+    themselves = sparse.csr_matrix(
+        (np.ones(size, dtype=np.float32), (np.arange(size), np.arange(start, stop))),
+        shape=block.shape
+    )
+    excluded = ((block + themselves) > 0).astype(np.float32)
+    scores = (scores - scores.multiply(excluded)).multiply(active.astype(np.float32)).tocsr()
+    scores.eliminate_zeros()
+    friends_of_friends.sort_indices()
+    return scores, friends_of_friends
+
+
+def top_k(scores, friends_of_friends, row, k):
+    """(column, score, mutual count) of the best `k` candidates in one row"""
+    import numpy as np
+
+    lo, hi = scores.indptr[row], scores.indptr[row + 1]
+    columns = scores.indices[lo:hi]
+    values = scores.data[lo:hi]
+    if len(values) > k:
+        best = np.argpartition(-values, k - 1)[:k]
+        columns, values = columns[best], values[best]
+    # Highest score first, ties broken by the lower user id
+    order = np.lexsort((columns, -values))
+    columns, values = columns[order], values[order]
+
+    # Friend-of-friend counts for those columns (0 for co-follower-only candidates)
+    lo, hi = friends_of_friends.indptr[row], friends_of_friends.indptr[row + 1]
+    fof_columns = friends_of_friends.indices[lo:hi]
+    fof_counts = friends_of_friends.data[lo:hi]
+    mutual = np.zeros(len(columns), dtype=np.int64)
+    if len(fof_columns):
+        positions = np.searchsorted(fof_columns, columns).clip(max=len(fof_columns) - 1)
+        hit = fof_columns[positions] == columns
+        mutual[hit] = fof_counts[positions[hit]]
+    return list(zip(columns.tolist(), values.tolist(), mutual.tolist()))
+
+
+def build_suggestions(top_k_size=DEFAULT_TOP_K, chunk_size=DEFAULT_CHUNK_SIZE,
+                      hub_followers=DEFAULT_HUB_FOLLOWERS):
+    """Rebuild FollowSuggestion for every user; returns the number of rows written"""
+    user_ids, active, adjacency = load_graph()
+    shared = without_hubs(adjacency, hub_followers)
+    shared_t = shared.T.tocsr()
+    written = 0
+    for start in range(0, len(user_ids), chunk_size):
+        stop = min(start + chunk_size, len(user_ids))
+        scores, friends_of_friends = score_block(adjacency, shared, shared_t, start, stop, active)
+        rows = []
+        for offset in range(stop - start):
+            for rank, (column, score, mutual) in enumerate(
+                top_k(scores, friends_of_friends, offset, top_k_size), start=1
+            ):
+                rows.append(FollowSuggestion(
+                    user_id=int(user_ids[start + offset]),
+                    candidate_id=int(user_ids[column]),
+                    rank=rank,
+                    score=score,
+                    mutual_count=mutual,
+                ))
+        # Swap a block of users over at once so readers never see it half built
+        block_ids = [int(pk) for pk in user_ids[start:stop]]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=block_ids).delete()
+            FollowSuggestion.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+    return written
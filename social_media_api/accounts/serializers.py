@@ -3,6 +3,8 @@ from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.authtoken.models import Token  # Required import
 from django.db import models
+from . import graph
+from .tokens import signed_tokens_enabled
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Serializer for user registration with token creation"""
@@ -43,11 +45,12 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             bio=validated_data.get('bio', '')
         )
         
-        # Create token for the user
-        token = Token.objects.create(user=user)
-        
-        # Add token to the user object for response
-        user.token = token.key
+        # Create token for the user (signed tokens need no row)
+        if not signed_tokens_enabled():
+            token = Token.objects.create(user=user)
+            
+            # Add token to the user object for response
+            user.token = token.key
         return user
 
 
@@ -68,10 +71,11 @@ class UserLoginSerializer(serializers.Serializer):
                 if not user.is_active:
                     raise serializers.ValidationError("User account is disabled.")
                 
-                # Get or create token
-                token, created = Token.objects.get_or_create(user=user)
                 data['user'] = user
-                data['token'] = token.key
+                # Get or create token (signed tokens are issued by the view)
+                if not signed_tokens_enabled():
+                    token, created = Token.objects.get_or_create(user=user)
+                    data['token'] = token.key
                 return data
             raise serializers.ValidationError("Invalid credentials.")
         raise serializers.ValidationError("Must provide username and password.")
@@ -85,4 +89,59 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = get_user_model()
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'bio', 
                   'profile_picture', 'followers_count', 'following_count')
-        read_only_fields = ('id', 'username', 'email', 'followers_count', 'following_count')
\ No newline at end of file
+        read_only_fields = ('id', 'username', 'email', 'followers_count', 'following_count')
+    
+    def update(self, instance, validated_data):
+        # Write only the edited columns: `instance` may be a cached request.user
+        # whose counters are older than the row's
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class FollowStateMixin:
+    """Follow relationship between the requesting user and the serialized one, from the cached graph"""
+    
+    def _viewer_id(self):
+        request = self.context.get('request')
+        return request.user.pk if request else None
+    
+    def get_is_following(self, obj):
+        viewer_id = self._viewer_id()
+        return viewer_id is not None and graph.is_following(viewer_id, obj.pk)
+    
+    def get_follows_you(self, obj):
+        viewer_id = self._viewer_id()
+        return viewer_id is not None and viewer_id in graph.following_ids(obj.pk)
+
+
+class UserListSerializer(FollowStateMixin, serializers.ModelSerializer):
+    """Row of the user directory"""
+    is_following = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = get_user_model()
+        fields = ('id', 'username', 'followers_count', 'is_following')
+        read_only_fields = fields
+
+
+class PublicProfileSerializer(FollowStateMixin, serializers.ModelSerializer):
+    """Another user's profile as seen by the requesting user"""
+    is_following = serializers.SerializerMethodField()
+    follows_you = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = get_user_model()
+        fields = ('id', 'username', 'first_name', 'last_name', 'bio', 'profile_picture',
+                  'followers_count', 'following_count', 'is_following', 'follows_you')
+        read_only_fields = fields
+
+
+class FollowSuggestionSerializer(serializers.Serializer):
+    """A precomputed suggestion, flattened onto the suggested user"""
+    id = serializers.IntegerField(source='candidate.id')
+    username = serializers.CharField(source='candidate.username')
+    followers_count = serializers.IntegerField(source='candidate.followers_count')
+    mutual_count = serializers.IntegerField()
+    score = serializers.FloatField()
@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_cached_user(sender, instance, created, **kwargs):
+    # Covers deactivation as well as profile edits showing up in request.user
+    if not created:
+        invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
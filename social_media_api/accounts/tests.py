@@ -1,3 +1,296 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from . import graph, tokens
+from .authentication import CachedTokenAuthentication, local_cache, stats
+from .checks import shared_cache_check
+from .models import FollowSuggestion
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class UserListTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.me = User.objects.create_user(username='me', password='testpass123')
+        self.others = [User.objects.create(username=name) for name in ('alice', 'albert', 'bob', 'carol')]
+        self.me.following.add(self.others[0], self.others[2])
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def test_is_following_from_cached_graph(self):
+        graph.following_ids(self.me.pk)  # warm the cache
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-list'))
+        rows = {row['username']: row['is_following'] for row in response.data['results']}
+        self.assertEqual(rows, {'albert': False, 'alice': True, 'bob': True, 'carol': False})
+
+    def test_prefix_search_and_pagination(self):
+        response = self.client.get(reverse('user-list'), {'search': 'AL', 'page_size': 1})
+        self.assertEqual([row['username'] for row in response.data['results']], ['albert'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['username'] for row in response.data['results']], ['alice'])
+        self.assertIsNone(response.data['next'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS={'BACKEND': 'sync'})
+class FollowGraphTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.me = User.objects.create_user(username='me', password='testpass123')
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def test_follow_and_unfollow_endpoints(self):
+        url = reverse('follow-user', args=[self.alice.pk])
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.post(reverse('follow-user', args=[self.me.pk])).status_code, 400)
+        self.assertEqual(self.client.post(reverse('follow-user', args=[999])).status_code, 404)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.followers_count, 1)
+
+        url = reverse('unfollow-user', args=[self.alice.pk])
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.followers_count, 0)
+
+    def test_membership_is_cached_and_invalidated(self):
+        self.assertFalse(graph.is_following(self.me.pk, self.alice.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(graph.is_following(self.me.pk, self.alice.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            graph.follow(self.me, self.alice)
+        self.assertTrue(graph.is_following(self.me.pk, self.alice.pk))
+        self.assertEqual(graph.follower_ids(self.alice.pk), {self.me.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            graph.unfollow(self.me, self.alice)
+        self.assertFalse(graph.is_following(self.me.pk, self.alice.pk))
+
+    def test_bulk_follow_and_mutuals(self):
+        graph.follow(self.me, self.alice)
+        new = graph.bulk_follow(self.me, [self.alice, self.bob, self.me])
+        self.assertEqual(new, [self.bob])
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.following_count, 2)
+
+        graph.follow(self.alice, self.me)
+        self.assertEqual(graph.mutual_ids(self.me.pk), {self.alice.pk})
+        response = self.client.get(reverse('mutuals'))
+        self.assertEqual([row['username'] for row in response.data['results']], ['alice'])
+
+        self.assertEqual(graph.bulk_unfollow(self.me, [self.alice, self.bob]), [self.alice, self.bob])
+        self.assertEqual(graph.following_ids(self.me.pk), frozenset())
+
+    def test_bulk_counters_follow_the_rows_not_the_cache(self):
+        graph.following_ids(self.me.pk)  # cached before the rows below change
+        graph.Follow.objects.create(from_customuser=self.me, to_customuser=self.alice)
+        self.assertEqual(graph.bulk_follow(self.me, [self.alice, self.bob, self.bob]), [self.bob])
+        self.me.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertEqual((self.me.following_count, self.alice.followers_count), (1, 0))
+
+        graph.following_ids(self.me.pk)
+        graph.Follow.objects.filter(to_customuser=self.bob).delete()
+        self.assertEqual(graph.bulk_unfollow(self.me, [self.alice, self.bob]), [self.alice])
+        self.me.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.me.following_count, self.bob.followers_count), (0, 1))
+
+    def test_profile_shows_both_directions(self):
+        graph.follow(self.alice, self.me)
+        response = self.client.get(reverse('user-detail', args=[self.alice.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_following'])
+        self.assertTrue(response.data['follows_you'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS={'BACKEND': 'sync'})
+class FollowSuggestionTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.me, self.alice, self.bob, self.carol, self.dave, self.erin = [
+            User.objects.create(username=name) for name in ('me', 'alice', 'bob', 'carol', 'dave', 'erin')
+        ]
+        # I follow alice and bob; both follow carol, only alice follows dave
+        self.me.following.add(self.alice, self.bob)
+        self.alice.following.add(self.carol, self.dave, self.me)
+        self.bob.following.add(self.carol)
+        self.erin.is_active = False
+        self.erin.save()
+        self.bob.following.add(self.erin)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def test_build_ranks_friends_of_friends(self):
+        call_command('build_follow_suggestions', top_k=5, stdout=StringIO())
+        rows = list(FollowSuggestion.objects.filter(user=self.me).values_list('candidate__username', 'mutual_count'))
+        # Never yourself, someone already followed or an inactive account
+        self.assertEqual(rows, [('carol', 2), ('dave', 1)])
+
+    def test_hubs_are_left_out_of_co_follower_scores(self):
+        hub, zed = User.objects.create(username='hub'), User.objects.create(username='zed')
+        self.me.following.add(hub)
+        for i in range(3):
+            fan = User.objects.create(username=f'fan{i}')
+            fan.following.add(hub, zed)
+
+        call_command('build_follow_suggestions', stdout=StringIO())
+        self.assertTrue(FollowSuggestion.objects.filter(user=self.me, candidate=zed).exists())
+        # hub has 4 followers: sharing it no longer makes the fans co-followers
+        call_command('build_follow_suggestions', hub_followers=3, stdout=StringIO())
+        rows = list(FollowSuggestion.objects.filter(user=self.me).values_list('candidate__username', 'mutual_count'))
+        self.assertEqual(rows, [('carol', 2), ('dave', 1)])
+
+    def test_endpoint_reads_table_and_skips_new_follows(self):
+        call_command('build_follow_suggestions', stdout=StringIO())
+        graph.following_ids(self.me.pk)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('follow-suggestions'))
+        self.assertEqual([row['username'] for row in response.data], ['carol', 'dave'])
+
+        graph.follow(self.me, self.carol)
+        response = self.client.get(reverse('follow-suggestions'))
+        self.assertEqual([row['username'] for row in response.data], ['dave'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TokenAuthCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        stats.reset()
+        self.user = User.objects.create(username='me')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_repeat_lookups_skip_the_database(self):
+        user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+        local_cache.clear()  # as if another process served the next request
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+        report = stats.as_dict()
+        self.assertEqual((report['misses'], report['local_hits'], report['shared_hits']), (1, 1, 1))
+        self.assertAlmostEqual(report['hit_rate'], 2 / 3)
+
+    def test_logout_invalidates_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(client.get(reverse('profile')).status_code, 200)
+        self.assertEqual(client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(client.get(reverse('profile')).status_code, 401)
+
+    def test_deactivation_invalidates_token(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_profile_edit_keeps_counters_moved_since_caching(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(client.get(reverse('profile')).status_code, 200)  # caches the user
+        graph.follow(User.objects.create(username='fan'), self.user)
+
+        response = client.put(reverse('profile'), {'bio': 'Hello'}, format='json')
+        self.assertEqual((response.data['bio'], response.data['followers_count']), ('Hello', 1))
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.bio, self.user.followers_count), ('Hello', 1))
+
+    def test_per_process_cache_is_flagged(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([w.id for w in shared_cache_check(None)], ['accounts.W001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            self.assertEqual(shared_cache_check(None), [])
+
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    SIGNED_TOKENS={'ENABLED': True, 'ACCESS_TTL': 60, 'REFRESH_TTL': 600},
+    CACHES={'default': {'BACKEND': LOCMEM}, 'revocations': {'BACKEND': LOCMEM, 'LOCATION': 'revocations'}},
+)
+class SignedTokenTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['revocations'].clear()
+        local_cache.clear()
+        User.objects.create_user(username='me', password='testpass123')
+        self.client = APIClient()
+        response = self.client.post(reverse('login'), {'username': 'me', 'password': 'testpass123'})
+        self.client.logout()  # drop the session so only the bearer token counts
+        self.pair = response.data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.pair['access']}")
+
+    def test_login_issues_signed_pair_without_token_row(self):
+        self.assertIn('refresh', self.pair)
+        self.assertNotIn('token', self.pair)
+        self.assertFalse(Token.objects.exists())
+
+    def test_verified_without_queries_once_user_is_cached(self):
+        self.assertEqual(self.client.get(reverse('auth-cache-stats')).status_code, 403)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('auth-cache-stats')).status_code, 403)
+
+    def test_refresh_rotates_and_logout_revokes(self):
+        url = reverse('token-refresh')
+        response = APIClient().post(url, {'refresh': self.pair['refresh']})
+        self.assertEqual(response.status_code, 200)
+        # A refresh token works once, and an access token is not a refresh token
+        self.assertEqual(APIClient().post(url, {'refresh': self.pair['refresh']}).status_code, 401)
+        self.assertEqual(APIClient().post(url, {'refresh': self.pair['access']}).status_code, 401)
+
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_expired_token_is_rejected(self):
+        with override_settings(SIGNED_TOKENS={'ENABLED': True, 'ACCESS_TTL': -1}):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_concurrent_refreshes_only_one_wins(self):
+        user_for = tokens.user_for
+        winners = []
+
+        def racing_user_for(payload):
+            # The other request passes verify() before either claims the token
+            if not winners:
+                winners.append(None)
+                winners[0] = tokens.refresh(self.pair['refresh'])
+            return user_for(payload)
+
+        with mock.patch.object(tokens, 'user_for', racing_user_for):
+            with self.assertRaises(AuthenticationFailed):
+                tokens.refresh(self.pair['refresh'])
+        self.assertIn('access', winners[0])
+
+    def test_refuses_to_run_without_a_durable_revocation_list(self):
+        self.assertIn('per-process', tokens.revocation_store_problem())
+        with self.assertRaises(ImproperlyConfigured):
+            tokens.check_revocation_store()
+        with override_settings(CACHES={'revocations': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            tokens.check_revocation_store()
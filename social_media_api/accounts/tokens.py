@@ -0,0 +1,172 @@
+"""
+Signed, expiring tokens (optional).
+
+An access token is the user id and a random token id, signed with
+SECRET_KEY and timestamped by django.core.signing, so checking it is an
+HMAC plus an expiry comparison rather than a row lookup. The user itself
+comes from the auth cache (see accounts/authentication.py). Access tokens
+are short lived; a longer lived refresh token trades itself in for a new
+pair at accounts/token/refresh/ and can only be used once.
+
+Logging out or refreshing puts the token id on a revocation list until
+the token would have expired anyway, so nothing is written to the
+database and there is no table to clean up. The list lives in its own
+cache alias (REVOCATION_CACHE), which must be shared by every worker and
+must never evict: a dropped entry would make a revoked token valid again.
+Only Redis qualifies, run with maxmemory-policy noeviction; the app
+refuses to start with signed tokens enabled on anything else. A refresh
+token is claimed with an atomic add(), so of two concurrent refreshes
+with the same token only one succeeds.
+
+Clients send access tokens as `Authorization: Bearer <token>`. Turned on
+with the SIGNED_TOKENS setting:
+
+    SIGNED_TOKENS = {
+        'ENABLED': False,     # issue signed tokens instead of DRF Token rows
+        'ACCESS_TTL': 900,    # seconds
+        'REFRESH_TTL': 7 * 24 * 60 * 60,
+        'REVOCATION_CACHE': 'revocations',  # alias in CACHES
+    }
+"""
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .authentication import cached_user
+
+DEFAULTS = {
+    'ENABLED': False,
+    'ACCESS_TTL': 15 * 60,
+    'REFRESH_TTL': 7 * 24 * 60 * 60,
+    'REVOCATION_CACHE': 'revocations',
+}
+
+# Cache backends that are shared between processes and don't evict on their own
+# (given a Redis server configured with maxmemory-policy noeviction)
+REVOCATION_BACKENDS = {
+    'django.core.cache.backends.redis.RedisCache',
+    'django_redis.cache.RedisCache',
+}
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SIGNED_TOKENS', {})}
+
+
+def signed_tokens_enabled():
+    return get_config()['ENABLED']
+
+
+def _ttl(kind):
+    return get_config()['ACCESS_TTL' if kind == ACCESS else 'REFRESH_TTL']
+
+
+def _signer(kind):
+    # A separate salt per kind, so a refresh token never passes as an access token
+    return signing.TimestampSigner(salt=f'accounts.tokens.{kind}')
+
+
+def revocation_store_problem():
+    """Why the configured revocation list can't be trusted, or None if it can"""
+    alias = get_config()['REVOCATION_CACHE']
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend is None:
+        return f'CACHES has no {alias!r} alias for the token revocation list.'
+    if backend not in REVOCATION_BACKENDS:
+        return (f'CACHES[{alias!r}] uses {backend}, which is per-process or evicts entries, '
+                f'so revoked tokens could become valid again.')
+    return None
+
+
+def check_revocation_store():
+    """Refuse to run signed tokens without a shared, non-evicting revocation list"""
+    if signed_tokens_enabled():
+        problem = revocation_store_problem()
+        if problem:
+            raise ImproperlyConfigured(f'SIGNED_TOKENS is enabled but {problem}')
+
+
+def _revocations():
+    return caches[get_config()['REVOCATION_CACHE']]
+
+
+def _revoked_key(token_id):
+    return f'auth-revoked:{token_id}'
+
+
+def issue(user, kind):
+    return _signer(kind).sign_object({'uid': user.pk, 'jti': secrets.token_urlsafe(12)}, compress=True)
+
+
+def issue_pair(user):
+    """Fresh access and refresh tokens, shaped for a login/register response"""
+    return {
+        'access': issue(user, ACCESS),
+        'refresh': issue(user, REFRESH),
+        'expires_in': _ttl(ACCESS),
+    }
+
+
+def verify(token, kind):
+    """Return the token's payload, or raise AuthenticationFailed"""
+    try:
+        payload = _signer(kind).unsign_object(token, max_age=_ttl(kind))
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed(_('Token expired.'))
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    if _revocations().get(_revoked_key(payload['jti'])):
+        raise exceptions.AuthenticationFailed(_('Token revoked.'))
+    return payload
+
+
+def revoke(payload, kind):
+    """Reject the token from now until it would have expired anyway"""
+    _revocations().set(_revoked_key(payload['jti']), True, _ttl(kind))
+
+
+def user_for(payload):
+    user = cached_user(payload['uid'])
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    return user
+
+
+def refresh(token):
+    """Swap a refresh token for a new pair; the old refresh token is revoked"""
+    payload = verify(token, REFRESH)
+    user = user_for(payload)
+    # Claim the token: add() only succeeds for the first of concurrent refreshes
+    if not _revocations().add(_revoked_key(payload['jti']), True, _ttl(REFRESH)):
+        raise exceptions.AuthenticationFailed(_('Token revoked.'))
+    return issue_pair(user)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticates `Authorization: Bearer <signed access token>` without a query"""
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        payload = verify(token, ACCESS)
+        return (user_for(payload), payload)
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -5,8 +5,13 @@ urlpatterns = [
     path('register/', views.UserRegistrationView.as_view(), name='register'),
     path('login/', views.UserLoginView.as_view(), name='login'),
     path('logout/', views.UserLogoutView.as_view(), name='logout'),
+    path('token/refresh/', views.TokenRefreshView.as_view(), name='token-refresh'),
+    path('auth-cache-stats/', views.AuthCacheStatsView.as_view(), name='auth-cache-stats'),
     path('profile/', views.UserProfileView.as_view(), name='profile'),
     path('follow/<int:user_id>/', views.FollowUserView.as_view(), name='follow-user'),
     path('unfollow/<int:user_id>/', views.UnfollowUserView.as_view(), name='unfollow-user'),
     path('users/', views.UserListView.as_view(), name='user-list'),
+    path('users/<int:user_id>/', views.UserDetailView.as_view(), name='user-detail'),
+    path('mutuals/', views.MutualsView.as_view(), name='mutuals'),
+    path('suggestions/', views.FollowSuggestionsView.as_view(), name='follow-suggestions'),
 ]
\ No newline at end of file
@@ -4,14 +4,26 @@ from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import login, logout
-from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer
-from .models import CustomUser
+from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer, UserListSerializer, PublicProfileSerializer, FollowSuggestionSerializer
+from .models import CustomUser, FollowSuggestion
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from rest_framework import generics
+from social_media_api.pagination import UsernameCursorPagination
+from rest_framework.exceptions import AuthenticationFailed
+from . import graph, tokens
+from .authentication import invalidate_token, stats as auth_cache_stats
 User = get_user_model()
 
+def issue_credentials(user):
+    """Signed access/refresh tokens when SIGNED_TOKENS is on, else the user's DRF token"""
+    if tokens.signed_tokens_enabled():
+        return tokens.issue_pair(user)
+    token, created = Token.objects.get_or_create(user=user)
+    return {'token': token.key}
+
+
 class UserRegistrationView(APIView):
     permission_classes = [permissions.AllowAny]
     
@@ -19,10 +31,8 @@ class UserRegistrationView(APIView):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            # Create token for the user
-            token, created = Token.objects.get_or_create(user=user)
             return Response({
-                'token': token.key,
+                **issue_credentials(user),
                 'user_id': user.id,
                 'username': user.username,
                 'message': 'User registered successfully'
@@ -38,9 +48,8 @@ class UserLoginView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             login(request, user)
-            token, created = Token.objects.get_or_create(user=user)
             return Response({
-                'token': token.key,
+                **issue_credentials(user),
                 'user_id': user.id,
                 'username': user.username,
                 'email': user.email
@@ -52,9 +61,22 @@ class UserLogoutView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        if isinstance(request.auth, dict):
+            # Signed token: revoke it, and the refresh token if one was sent
+            tokens.revoke(request.auth, tokens.ACCESS)
+            if request.data.get('refresh'):
+                try:
+                    tokens.revoke(tokens.verify(request.data['refresh'], tokens.REFRESH), tokens.REFRESH)
+                except AuthenticationFailed:
+                    pass
+            logout(request)
+            return Response({'message': 'Successfully logged out.'}, status=status.HTTP_200_OK)
+        
         # Delete the token to logout
         try:
-            request.user.auth_token.delete()
+            token = request.user.auth_token
+            invalidate_token(token.key)
+            token.delete()
         except (AttributeError, Token.DoesNotExist):
             pass
         
@@ -62,14 +84,32 @@ class UserLogoutView(APIView):
         return Response({'message': 'Successfully logged out.'}, status=status.HTTP_200_OK)
 
 
+class TokenRefreshView(APIView):
+    """Trade a signed refresh token for a new access/refresh pair"""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    
+    def post(self, request):
+        if not request.data.get('refresh'):
+            return Response({'error': 'refresh is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            pair = tokens.refresh(request.data['refresh'])
+        except AuthenticationFailed as exc:
+            return Response({'error': str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(pair, status=status.HTTP_200_OK)
+
+
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
+        # request.user may come from the auth cache; counters change without a save
+        request.user.refresh_from_db(fields=['followers_count', 'following_count'])
         serializer = UserProfileSerializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     def put(self, request):
+        request.user.refresh_from_db(fields=['followers_count', 'following_count'])
         serializer = UserProfileSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -77,116 +117,101 @@ class UserProfileView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class FollowUserView(APIView):
-    permission_classes = [IsAuthenticated]
+class AuthCacheStatsView(APIView):
+    """Token auth cache hit rate and latency for this process (staff only)"""
+    permission_classes = [permissions.IsAdminUser]
     
-    def post(self, request, user_id):
-        try:
-            user_to_follow = CustomUser.objects.get(id=user_id)
-        except CustomUser.DoesNotExist:
-            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
-        
-        if request.user == user_to_follow:
-            return Response({'error': 'Cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if user_to_follow in request.user.followers.all():
-            request.user.followers.remove(user_to_follow)
-            return Response({'message': f'Unfollowed {user_to_follow.username}'}, status=status.HTTP_200_OK)
-        else:
-            request.user.followers.add(user_to_follow)
-            return Response({'message': f'Following {user_to_follow.username}'}, status=status.HTTP_200_OK)
-        
-        
-        
-class FollowUserView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def post(self, request, user_id):
-        """Follow a user"""
-        try:
-            user_to_follow = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return Response({'error': 'User not found'}, status=404)
-        
-        if request.user == user_to_follow:
-            return Response({'error': 'Cannot follow yourself'}, status=400)
-        
-        if user_to_follow in request.user.following.all():
-            return Response({'error': 'Already following this user'}, status=400)
-        
-        request.user.following.add(user_to_follow)
-        return Response({'message': f'Now following {user_to_follow.username}'}, status=200)
-
+    def get(self, request):
+        return Response(auth_cache_stats.as_dict(), status=status.HTTP_200_OK)
 
-class UnfollowUserView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-    
-    def post(self, request, user_id):
-        """Unfollow a user"""
-        try:
-            user_to_unfollow = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return Response({'error': 'User not found'}, status=404)
-        
-        if user_to_unfollow not in request.user.following.all():
-            return Response({'error': 'Not following this user'}, status=400)
-        
-        request.user.following.remove(user_to_unfollow)
-        return Response({'message': f'Unfollowed {user_to_unfollow.username}'}, status=200)
-    
-    
 
-class FollowUserView(generics.GenericAPIView):  # Use generics.GenericAPIView
+class FollowUserView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, user_id):
         """Follow a user"""
         try:
-            user_to_follow = User.objects.get(id=user_id)  # Using User model
+            user_to_follow = User.objects.get(id=user_id)
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         
         if request.user == user_to_follow:
             return Response({'error': 'Cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if user_to_follow in request.user.following.all():
+        if not graph.follow(request.user, user_to_follow):
             return Response({'error': 'Already following this user'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        request.user.following.add(user_to_follow)
         return Response({'message': f'Now following {user_to_follow.username}'}, status=status.HTTP_200_OK)
 
 
-class UnfollowUserView(generics.GenericAPIView):  # Use generics.GenericAPIView
+class UnfollowUserView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, user_id):
         """Unfollow a user"""
         try:
-            user_to_unfollow = User.objects.get(id=user_id)  # Using User model
+            user_to_unfollow = User.objects.get(id=user_id)
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        if user_to_unfollow not in request.user.following.all():
+        if not graph.unfollow(request.user, user_to_unfollow):
             return Response({'error': 'Not following this user'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        request.user.following.remove(user_to_unfollow)
         return Response({'message': f'Unfollowed {user_to_unfollow.username}'}, status=status.HTTP_200_OK)
 
 
-# Optional: Add this if you want to list all users to follow
+class UserDetailView(generics.RetrieveAPIView):
+    """Public profile of another user, with the follow relationship both ways"""
+    serializer_class = PublicProfileSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = User.objects.all()
+    lookup_url_kwarg = 'user_id'
+
+
+class MutualsView(generics.ListAPIView):
+    """Users the current user follows who follow them back"""
+    serializer_class = UserListSerializer
+    pagination_class = UsernameCursorPagination
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return User.objects.filter(pk__in=graph.mutual_ids(self.request.user.pk)).only('id', 'username', 'followers_count')
+
+
 class UserListView(generics.ListAPIView):
-    """List all users (for finding users to follow)"""
-    queryset = User.objects.all()  # This satisfies CustomUser.objects.all()
+    """List users to follow; ?search=<prefix> filters by username"""
+    serializer_class = UserListSerializer
+    pagination_class = UsernameCursorPagination
     permission_classes = [permissions.IsAuthenticated]
     
-    def list(self, request):
-        users = User.objects.all()
-        data = []
-        for user in users:
-            if user != request.user:  # Don't show current user
-                data.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'is_following': user in request.user.following.all()
-                })
-        return Response(data)
\ No newline at end of file
+    def get_queryset(self):
+        users = (
+            User.objects.exclude(pk=self.request.user.pk)  # Don't show current user
+            .only('id', 'username', 'followers_count')
+        )
+        search = self.request.query_params.get('search', '').strip()
+        if search:
+            # A prefix match (LIKE 'q%') can use the unique index on username
+            users = users.filter(username__istartswith=search)
+        return users
+
+
+class FollowSuggestionsView(generics.ListAPIView):
+    """
+    "Who to follow", read straight from the table build_follow_suggestions
+    fills. Users followed since the last build are skipped via the graph cache.
+    """
+    serializer_class = FollowSuggestionSerializer
+    pagination_class = None
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return (
+            FollowSuggestion.objects.filter(user=self.request.user)
+            .select_related('candidate')
+            .only('rank', 'score', 'mutual_count', 'candidate__id', 'candidate__username', 'candidate__followers_count')
+            .order_by('rank')
+        )
+    
+    def list(self, request, *args, **kwargs):
+        following = graph.following_ids(request.user.pk)
+        suggestions = [s for s in self.get_queryset() if s.candidate_id not in following]
+        return Response(self.get_serializer(suggestions, many=True).data)
@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+from .models import Notification
+
+UNREAD_COUNT_TIMEOUT = 300
+
+
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """Number of unread notifications for a user, cached until something changes it"""
+    key = _unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_unread_count(*user_ids):
+    cache.delete_many([_unread_key(user_id) for user_id in user_ids])
@@ -0,0 +1,310 @@
+"""
+Notification dispatch.
+
+`notify()` hands a notification to a queue and returns straight away;
+the queue writes Notification rows in batches with bulk_create.
+
+Verbs in AGGREGATE_VERBS are folded into one row per (recipient, verb,
+target) that counts the actors and keeps a sample of the latest ones, so
+a post with 10k likes costs its author one row (the notif_group_unique
+constraint holds it to one even with several writers). Other verbs get a row
+each, except that repeats of the same (recipient, actor, verb, target)
+inside DEDUP_WINDOW seconds are dropped.
+
+Configured through the NOTIFICATIONS setting:
+
+    NOTIFICATIONS = {
+        'BACKEND': 'thread',    # 'thread', 'database' or 'sync'
+        'WORKERS': 2,           # worker threads for the 'thread' backend
+        'BATCH_SIZE': 500,
+        'FLUSH_INTERVAL': 0.5,  # seconds a worker waits to fill a batch
+        'DEDUP_WINDOW': 600,    # seconds, 0 turns collapsing off
+        'AGGREGATE_VERBS': ['liked your post', ...],  # one row per target
+        'ACTOR_SAMPLE_SIZE': 5,  # actor ids kept on an aggregated row
+    }
+
+'thread' keeps an in-process queue drained by a pool of worker threads.
+'database' stores the queue in PendingNotification so any process can
+enqueue and `manage.py process_notifications` drains it. 'sync' writes
+in the calling thread, which is what tests want.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .cache import invalidate_unread_count
+from .models import Notification, PendingNotification
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'thread',
+    'WORKERS': 2,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'DEDUP_WINDOW': 600,
+    'AGGREGATE_VERBS': ['liked your post', 'commented on your post', 'started following you'],
+    'ACTOR_SAMPLE_SIZE': 5,
+}
+
+# Tries at folding a batch into aggregated rows before giving up
+AGGREGATE_ATTEMPTS = 3
+
+NotificationEvent = namedtuple(
+    'NotificationEvent',
+    ['recipient_id', 'actor_id', 'verb', 'content_type_id', 'object_id']
+)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def _write_plain(events):
+    """Insert one row per event, skipping repeats inside the dedup window"""
+    window = get_config()['DEDUP_WINDOW']
+    if window and events:
+        cutoff = timezone.now() - timedelta(seconds=window)
+        recent = set(
+            Notification.objects.filter(
+                recipient_id__in={event.recipient_id for event in events},
+                timestamp__gte=cutoff
+            ).values_list('recipient_id', 'actor_id', 'verb', 'content_type_id', 'object_id')
+        )
+        events = [event for event in events if tuple(event) not in recent]
+    Notification.objects.bulk_create(
+        [Notification(**event._asdict()) for event in events],
+        batch_size=get_config()['BATCH_SIZE']
+    )
+    return len(events)
+
+
+def _existing_groups(groups):
+    """Lock and return the aggregated rows for `groups`, keyed by group"""
+    existing = {}
+    candidates = Notification.objects.select_for_update().filter(
+        aggregated=True,
+        recipient_id__in={group[0] for group in groups},
+        verb__in={group[1] for group in groups},
+        object_id__in={group[3] for group in groups},
+    )
+    for notification in candidates:
+        group = (notification.recipient_id, notification.verb, notification.content_type_id, notification.object_id)
+        if group in groups:
+            existing[group] = notification
+    return existing
+
+
+def _fold(actors_by_group):
+    sample_size = get_config()['ACTOR_SAMPLE_SIZE']
+    now = timezone.now()
+    existing = _existing_groups(actors_by_group)
+    created, updated = [], []
+    for group, actor_ids in actors_by_group.items():
+        notification = existing.get(group)
+        if notification is None:
+            recipient_id, verb, content_type_id, object_id = group
+            notification = Notification(
+                recipient_id=recipient_id, verb=verb,
+                content_type_id=content_type_id, object_id=object_id,
+                actor_count=0, recent_actors=[], aggregated=True
+            )
+            created.append(notification)
+        else:
+            updated.append(notification)
+        for actor_id in actor_ids:
+            # An actor already in the sample (e.g. like, unlike, like
+            # again) moves to the front without being counted twice
+            if actor_id in notification.recent_actors:
+                notification.recent_actors.remove(actor_id)
+            else:
+                notification.actor_count += 1
+            notification.recent_actors.insert(0, actor_id)
+        del notification.recent_actors[sample_size:]
+        notification.actor_id = notification.recent_actors[0]
+        notification.timestamp = now
+        notification.read = False
+
+    Notification.objects.bulk_create(created, batch_size=get_config()['BATCH_SIZE'])
+    Notification.objects.bulk_update(
+        updated,
+        ['actor', 'actor_count', 'recent_actors', 'timestamp', 'read'],
+        batch_size=get_config()['BATCH_SIZE']
+    )
+    return len(created) + len(updated)
+
+
+def _write_aggregated(events):
+    """Fold events into one row per (recipient, verb, target) group"""
+    actors_by_group = {}
+    for event in events:
+        group = (event.recipient_id, event.verb, event.content_type_id, event.object_id)
+        actors_by_group.setdefault(group, []).append(event.actor_id)
+    if not actors_by_group:
+        return 0
+
+    for attempt in range(AGGREGATE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return _fold(actors_by_group)
+        except IntegrityError:
+            # Another writer inserted one of these groups after we looked
+            # (notif_group_unique); the next attempt locks and updates it
+            if attempt == AGGREGATE_ATTEMPTS - 1:
+                raise
+
+
+def write_batch(events):
+    """Write one batch of events; returns the number of rows inserted or updated"""
+    events = list(dict.fromkeys(events))  # drop repeats inside the batch, keep order
+    aggregate_verbs = get_config()['AGGREGATE_VERBS']
+    written = (
+        _write_aggregated([event for event in events if event.verb in aggregate_verbs])
+        + _write_plain([event for event in events if event.verb not in aggregate_verbs])
+    )
+    recipients = {event.recipient_id for event in events}
+    transaction.on_commit(lambda: invalidate_unread_count(*recipients))
+    return written
+
+
+class SyncQueue:
+    """Writes each notification immediately in the calling thread"""
+
+    def put(self, event):
+        write_batch([event])
+
+    def flush(self):
+        return 0
+
+
+class ThreadQueue:
+    """In-process queue drained in batches by a pool of daemon worker threads"""
+
+    def __init__(self, workers, batch_size, flush_interval):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def put(self, event):
+        self._start()
+        self.queue.put(event)
+
+    def _start(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name='notification-worker', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_batch(self, block=True):
+        try:
+            batch = [self.queue.get(block=block)]
+        except queue.Empty:
+            return []
+        # Wait up to flush_interval for the batch to fill, unless draining
+        deadline = time.monotonic() + (self.flush_interval if block else 0)
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                write_batch(batch)
+            except Exception:
+                logger.exception('Dropped %d notifications', len(batch))
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write everything still queued from the calling thread"""
+        written = 0
+        while True:
+            batch = self._next_batch(block=False)
+            if not batch:
+                return written
+            written += write_batch(batch)
+
+
+class DatabaseQueue:
+    """Queue stored in PendingNotification, shared by every process"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def put(self, event):
+        PendingNotification.objects.create(**event._asdict())
+
+    def drain_batch(self):
+        """Claim and write one batch; returns how many pending rows were consumed"""
+        with transaction.atomic():
+            pending = list(
+                PendingNotification.objects.select_for_update(skip_locked=True)
+                .order_by('id')[:self.batch_size]
+            )
+            if pending:
+                write_batch([
+                    NotificationEvent(p.recipient_id, p.actor_id, p.verb, p.content_type_id, p.object_id)
+                    for p in pending
+                ])
+                PendingNotification.objects.filter(id__in=[p.id for p in pending]).delete()
+        return len(pending)
+
+    def flush(self):
+        written = 0
+        while True:
+            count = self.drain_batch()
+            if not count:
+                return written
+            written += count
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue():
+    config = get_config()
+    backend = config['BACKEND']
+    with _queues_lock:
+        if backend not in _queues:
+            if backend == 'sync':
+                _queues[backend] = SyncQueue()
+            elif backend == 'thread':
+                _queues[backend] = ThreadQueue(config['WORKERS'], config['BATCH_SIZE'], config['FLUSH_INTERVAL'])
+                atexit.register(_queues[backend].flush)
+            elif backend == 'database':
+                _queues[backend] = DatabaseQueue(config['BATCH_SIZE'])
+            else:
+                raise ValueError(f'Unknown notification backend: {backend}')
+        return _queues[backend]
+
+
+def notify(recipient_id, actor_id, verb, target_model, target_id):
+    """Queue a notification for `recipient_id` about `target_model` #`target_id`"""
+    if recipient_id == actor_id:  # Don't notify yourself
+        return
+    content_type = ContentType.objects.get_for_model(target_model)
+    get_queue().put(NotificationEvent(recipient_id, actor_id, verb, content_type.id, target_id))
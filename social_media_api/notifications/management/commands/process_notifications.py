@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.dispatch import DatabaseQueue, get_config
+
+
+class Command(BaseCommand):
+    help = "Write queued notifications for the 'database' dispatch backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        pending_queue = DatabaseQueue(get_config()['BATCH_SIZE'])
+        total = 0
+        while True:
+            count = pending_queue.drain_batch()
+            total += count
+            if count:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} queued notifications'))
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+# Frozen copies of the dispatch defaults, so later edits there can't change
+# what this migration does
+DEFAULT_AGGREGATE_VERBS = ['liked your post', 'commented on your post', 'started following you']
+DEFAULT_ACTOR_SAMPLE_SIZE = 5
+
+
+def flag_aggregated_rows(apps, schema_editor):
+    """
+    Mark aggregated rows, folding any duplicate groups into their newest
+    row first so the unique constraint can be added.
+    """
+    Notification = apps.get_model('notifications', 'Notification')
+    config = getattr(settings, 'NOTIFICATIONS', {})
+    verbs = config.get('AGGREGATE_VERBS', DEFAULT_AGGREGATE_VERBS)
+    sample_size = config.get('ACTOR_SAMPLE_SIZE', DEFAULT_ACTOR_SAMPLE_SIZE)
+    group_fields = ['recipient_id', 'verb', 'content_type_id', 'object_id']
+
+    duplicates = (
+        Notification.objects.filter(verb__in=verbs)
+        .values(*group_fields).annotate(rows=Count('id')).filter(rows__gt=1)
+    )
+    for group in duplicates.iterator():
+        del group['rows']
+        keep, *rest = Notification.objects.filter(**group).order_by('-timestamp', '-id')
+        for notification in rest:
+            keep.actor_count += notification.actor_count
+            keep.recent_actors += [a for a in notification.recent_actors if a not in keep.recent_actors]
+            keep.read = keep.read and notification.read
+        del keep.recent_actors[sample_size:]
+        keep.save(update_fields=['actor_count', 'recent_actors', 'read'])
+        Notification.objects.filter(pk__in=[notification.pk for notification in rest]).delete()
+
+    Notification.objects.filter(verb__in=verbs).update(aggregated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0005_remove_notification_notif_recipient_read_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='aggregated',
+            field=models.BooleanField(editable=False, null=True),
+        ),
+        migrations.RunPython(flag_aggregated_rows, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_group_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(
+                fields=('recipient', 'verb', 'content_type', 'object_id', 'aggregated'),
+                name='notif_group_unique',
+            ),
+        ),
+    ]
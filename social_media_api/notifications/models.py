@@ -16,8 +16,48 @@ class Notification(models.Model):
     read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
     
+    # Aggregated notifications ("alice and 41 others liked your post") keep
+    # one row per (recipient, verb, target): `actor` is the latest actor,
+    # `actor_count` how many there were and `recent_actors` the ids of the
+    # last few, newest first
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+    # True on aggregated rows and NULL on the rest, so the unique constraint
+    # below allows one row per group while plain rows never collide (NULLs
+    # are distinct; MySQL has no conditional unique constraints)
+    aggregated = models.BooleanField(null=True, editable=False)
+    
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_recipient_time_idx'),
+            # Serves both the unread count and the ?unread=true listing
+            models.Index(fields=['recipient', 'read', '-timestamp', '-id'], name='notif_unread_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'verb', 'content_type', 'object_id', 'aggregated'],
+                name='notif_group_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        return self.summary()
+    
+    def summary(self):
+        others = self.actor_count - 1
+        if others <= 0:
+            return f"{self.actor.username} {self.verb}"
+        return f"{self.actor.username} and {others} other{'s' if others > 1 else ''} {self.verb}"
+
+class PendingNotification(models.Model):
+    """Notification waiting to be written, used by the 'database' dispatch backend"""
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=255)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    object_id = models.PositiveIntegerField()
+    queued_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.actor.username} {self.verb}"
\ No newline at end of file
+        return f"{self.actor_id} {self.verb} (pending)"
@@ -0,0 +1,31 @@
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers
+from .models import Notification
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    actor = serializers.CharField(source='actor.username', read_only=True)
+    summary = serializers.CharField(read_only=True)
+    target_type = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'actor', 'actor_count', 'recent_actors', 'verb', 'summary',
+                  'target_type', 'object_id', 'read', 'timestamp']
+        read_only_fields = fields
+
+    def get_target_type(self, obj):
+        # get_for_id is served from ContentType's own cache
+        return ContentType.objects.get_for_id(obj.content_type_id).model
+
+
+class MarkReadSerializer(serializers.Serializer):
+    """
+    Which notifications to mark read; with no fields, all of them.
+
+    `before` is the timestamp of the newest notification the client has
+    shown. It bounds by timestamp rather than id because an aggregated row
+    keeps its id when new actors regroup into it, and those must stay unread.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    before = serializers.DateTimeField(required=False)
@@ -1,3 +1,191 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from posts.models import Post
+from . import dispatch
+from .dispatch import DatabaseQueue, NotificationEvent, ThreadQueue, notify, write_batch
+from .models import Notification, PendingNotification
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATIONS={'BACKEND': 'sync', 'DEDUP_WINDOW': 600})
+class DispatchTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+
+    def event(self, verb='mentioned you'):
+        notify(self.author.pk, self.fan.pk, verb, Post, self.post.pk)
+        return Notification.objects.filter(recipient=self.author).count()
+
+    def test_repeats_inside_window_are_collapsed(self):
+        self.assertEqual(self.event(), 1)
+        self.assertEqual(self.event(), 1)
+        self.assertEqual(self.event('replied to you'), 2)
+
+    @override_settings(NOTIFICATIONS={'BACKEND': 'sync', 'DEDUP_WINDOW': 0})
+    def test_collapsing_can_be_turned_off(self):
+        self.event()
+        self.assertEqual(self.event(), 2)
+
+    def test_self_notifications_are_skipped(self):
+        notify(self.author.pk, self.author.pk, 'liked your post', Post, self.post.pk)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_batches_collapse_duplicates(self):
+        event = NotificationEvent(self.author.pk, self.fan.pk, 'liked your post', 1, self.post.pk)
+        self.assertEqual(write_batch([event, event, event]), 1)
+
+    def test_thread_queue_flush(self):
+        thread_queue = ThreadQueue(workers=0, batch_size=2, flush_interval=0)
+        for user in User.objects.all():
+            thread_queue.put(NotificationEvent(self.author.pk, user.pk, 'started following you', 1, user.pk))
+        self.assertEqual(thread_queue.flush(), 2)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_database_queue_drain(self):
+        db_queue = DatabaseQueue(batch_size=10)
+        db_queue.put(NotificationEvent(self.author.pk, self.fan.pk, 'liked your post', 1, self.post.pk))
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(db_queue.flush(), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertFalse(PendingNotification.objects.exists())
+
+
+@override_settings(NOTIFICATIONS={'BACKEND': 'sync', 'ACTOR_SAMPLE_SIZE': 3})
+class AggregationTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.fans = [User.objects.create(username=f'fan{i}') for i in range(42)]
+
+    def test_likes_fold_into_one_row(self):
+        for fan in self.fans:
+            notify(self.author.pk, fan.pk, 'liked your post', Post, self.post.pk)
+
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.actor_count, 42)
+        self.assertEqual(notification.recent_actors, [fan.pk for fan in reversed(self.fans[-3:])])
+        self.assertEqual(notification.summary(), 'fan41 and 41 others liked your post')
+
+    def test_batch_and_repeat_actors(self):
+        Notification.objects.create(
+            recipient=self.author, actor=self.fans[0], verb='liked your post',
+            content_type_id=1, object_id=self.post.pk, read=True, recent_actors=[self.fans[0].pk],
+            aggregated=True
+        )
+        event = NotificationEvent(self.author.pk, self.fans[0].pk, 'liked your post', 1, self.post.pk)
+        other = event._replace(actor_id=self.fans[1].pk)
+        write_batch([event, other])
+
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.summary(), 'fan1 and 1 other liked your post')
+        self.assertFalse(notification.read)
+
+
+    def test_one_row_per_group(self):
+        fields = dict(recipient=self.author, actor=self.fans[0], verb='liked your post',
+                      content_type_id=1, object_id=self.post.pk)
+        Notification.objects.create(**fields, aggregated=True)
+        Notification.objects.create(**fields)  # plain rows never collide
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(**fields, aggregated=True)
+
+    def test_group_created_concurrently_is_updated(self):
+        Notification.objects.create(
+            recipient=self.author, actor=self.fans[1], verb='liked your post', content_type_id=1,
+            object_id=self.post.pk, recent_actors=[self.fans[1].pk], aggregated=True
+        )
+        existing_groups = dispatch._existing_groups
+        # The first look happens before the other writer's row is visible
+        misses = [{}]
+
+        def racing_lookup(groups):
+            return misses.pop() if misses else existing_groups(groups)
+
+        event = NotificationEvent(self.author.pk, self.fans[0].pk, 'liked your post', 1, self.post.pk)
+        with mock.patch.object(dispatch, '_existing_groups', racing_lookup):
+            write_batch([event])
+
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertFalse(misses)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.recent_actors, [self.fans[0].pk, self.fans[1].pk])
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS={'BACKEND': 'sync'})
+class NotificationEndpointsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='testpass123')
+        self.actors = [User.objects.create(username=f'actor{i}') for i in range(5)]
+        for actor in self.actors:
+            notify(self.user.pk, actor.pk, 'mentioned you', User, actor.pk)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_is_paginated_without_per_row_queries(self):
+        # session/auth is forced, so: one query for the page
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('notification-list'), {'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['summary'], 'actor4 mentioned you')
+        self.assertIsNotNone(response.data['next'])
+
+    def test_unread_count_and_mark_read(self):
+        response = self.client.get(reverse('notification-unread-count'))
+        self.assertEqual(response.data['unread'], 5)
+
+        self.stamp_in_order()
+        seen = self.client.get(reverse('notification-list'), {'page_size': 3}).data['results']
+        response = self.client.post(reverse('notification-mark-read'), {'before': seen[-1]['timestamp']}, format='json')
+        self.assertEqual(response.data['marked'], 3)
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread'], 2)
+
+        response = self.client.get(reverse('notification-list'), {'unread': 'true'})
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.client.post(reverse('notification-mark-read'))
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread'], 0)
+
+    def stamp_in_order(self):
+        # One row per second, oldest first, so timestamps never tie
+        start = timezone.now() - timezone.timedelta(minutes=1)
+        for i, notification in enumerate(Notification.objects.filter(recipient=self.user).order_by('id')):
+            Notification.objects.filter(pk=notification.pk).update(timestamp=start + timezone.timedelta(seconds=i))
+
+    def test_mark_read_leaves_regrouped_rows_unread(self):
+        self.stamp_in_order()
+        group = Notification.objects.create(
+            recipient=self.user, actor=self.actors[0], verb='liked your post',
+            content_type=ContentType.objects.get_for_model(Post), object_id=1,
+            recent_actors=[self.actors[0].pk], aggregated=True
+        )
+        seen = self.client.get(reverse('notification-list')).data['results']
+        # Someone else likes the post after the list was loaded: same id, new timestamp
+        notify(self.user.pk, self.actors[1].pk, 'liked your post', Post, 1)
+
+        response = self.client.post(reverse('notification-mark-read'), {'before': seen[0]['timestamp']}, format='json')
+        self.assertEqual(response.data['marked'], 5)
+        group.refresh_from_db()
+        self.assertFalse(group.read)
+        self.assertEqual(group.actor_count, 2)
+
+    def test_new_notification_invalidates_count(self):
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread'], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.user.pk, self.actors[0].pk, 'replied to you', User, self.actors[0].pk)
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data['unread'], 6)
@@ -1,22 +1,47 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from .models import Notification
+from .serializers import NotificationSerializer, MarkReadSerializer
+from .cache import unread_count, invalidate_unread_count
+from social_media_api.pagination import TimestampCursorPagination
 
 class NotificationListView(generics.ListAPIView):
+    """Notifications for the current user, newest first; ?unread=true for unread only"""
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimestampCursorPagination
+    serializer_class = NotificationSerializer
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        queryset = Notification.objects.filter(recipient=self.request.user).select_related('actor')
+        if self.request.query_params.get('unread') in ('1', 'true', 'True'):
+            queryset = queryset.filter(read=False)
+        return queryset
+
+
+class UnreadCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        return Response({'unread': unread_count(request.user.pk)}, status=status.HTTP_200_OK)
+
+
+class MarkReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
     
-    def list(self, request):
-        notifications = self.get_queryset()
-        data = []
-        for notification in notifications:
-            data.append({
-                'id': notification.id,
-                'actor': notification.actor.username,
-                'verb': notification.verb,
-                'read': notification.read,
-                'timestamp': notification.timestamp
-            })
-        return Response(data)
\ No newline at end of file
+    def post(self, request):
+        """Mark notifications read with a single UPDATE"""
+        serializer = MarkReadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        notifications = Notification.objects.filter(recipient=request.user, read=False)
+        data = serializer.validated_data
+        if 'ids' in data:
+            notifications = notifications.filter(id__in=data['ids'])
+        if 'before' in data:
+            notifications = notifications.filter(timestamp__lte=data['before'])
+        
+        marked = notifications.update(read=True)
+        invalidate_unread_count(request.user.pk)
+        return Response({'marked': marked}, status=status.HTTP_200_OK)
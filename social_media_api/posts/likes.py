@@ -0,0 +1,60 @@
+"""
+Like/unlike without reading before writing.
+
+A like is inserted with the backend's conflict-ignoring INSERT (INSERT
+IGNORE on MySQL, ON CONFLICT DO NOTHING elsewhere), so a repeated tap is
+a no-op rather than a SELECT followed by an IntegrityError. The post's
+likes_count is bumped in the same transaction only when a row was
+actually written, and the author notification is queued after the commit.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from notifications.dispatch import notify
+from social_media_api.counters import increment, decrement
+from social_media_api.db import insert_ignore
+from .models import Post, Like
+
+
+def _notify_author(user_id, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list('author_id', flat=True).first()
+    if author_id is not None:
+        notify(author_id, user_id, "liked your post", Post, post_id)
+
+
+def like_post(user, post_id):
+    """
+    Like a post. Returns True if this created the like and False if it
+    already existed. Raises Post.DoesNotExist for an unknown post.
+    """
+    with transaction.atomic():
+        try:
+            created = insert_ignore(Like, user_id=user.pk, post_id=post_id, created_at=timezone.now())
+        except IntegrityError:
+            # Backends with immediate foreign key checks reject it here
+            raise Post.DoesNotExist
+        # The counter UPDATE matching no row also means there is no such
+        # post; raising rolls the insert back on deferred-FK backends
+        if created and not increment(Post, post_id, 'likes_count'):
+            raise Post.DoesNotExist
+        if created:
+            transaction.on_commit(lambda: _notify_author(user.pk, post_id))
+        elif not Post.objects.filter(pk=post_id).exists():
+            # MySQL's INSERT IGNORE turns the foreign key violation into a
+            # warning, so an unknown post looks like an existing like
+            raise Post.DoesNotExist
+    return created
+
+
+def unlike_post(user, post_id):
+    """
+    Remove a like. Returns True if a like was deleted and False if there
+    was none. Raises Post.DoesNotExist for an unknown post.
+    """
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post_id=post_id).delete()
+        if deleted:
+            decrement(Post, post_id, 'likes_count')
+        elif not Post.objects.filter(pk=post_id).exists():
+            raise Post.DoesNotExist
+    return bool(deleted)
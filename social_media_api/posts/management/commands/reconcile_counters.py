@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, Comment, Like
+from social_media_api.counters import backfill, count_of
+
+User = get_user_model()
+Follow = User.following.through
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized like/comment/follow counters and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed = backfill(Post, {
+            'likes_count': count_of(Like.objects.all(), 'post'),
+            'comments_count': count_of(Comment.objects.all(), 'post'),
+        }, batch_size, drifted_only=True)
+        self.stdout.write(f'Repaired {fixed} posts')
+        fixed = backfill(User, {
+            'followers_count': count_of(Follow.objects.all(), 'to_customuser'),
+            'following_count': count_of(Follow.objects.all(), 'from_customuser'),
+        }, batch_size, drifted_only=True)
+        self.stdout.write(f'Repaired {fixed} users')
+        self.stdout.write(self.style.SUCCESS('Counters reconciled'))
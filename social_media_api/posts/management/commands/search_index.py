@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.search import InvertedIndexBackend, get_backend
+
+
+class Command(BaseCommand):
+    help = 'Maintain the on-disk post search index (inverted index backend only)'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--rebuild', action='store_true', help='Recreate the index from the database')
+        group.add_argument('--compact', action='store_true', help='Fold the change log into the snapshot')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if not isinstance(backend, InvertedIndexBackend):
+            raise CommandError('The MySQL FULLTEXT index is maintained by the database')
+        if options['rebuild']:
+            count = backend.rebuild()
+        else:
+            count = backend.compact()
+        self.stdout.write(self.style.SUCCESS(f'Search index holds {count} posts'))
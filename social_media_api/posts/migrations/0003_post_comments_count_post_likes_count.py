@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+from social_media_api.counters import backfill, count_of
+
+
+def backfill_post_counters(apps, schema_editor):
+    """Start the new counters from the rows that already exist"""
+    Post = apps.get_model('posts', 'Post')
+    backfill(Post, {
+        'likes_count': count_of(apps.get_model('posts', 'Like').objects.all(), 'post'),
+        'comments_count': count_of(apps.get_model('posts', 'Comment').objects.all(), 'post'),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_like_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_post_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def add_fulltext_index(apps, schema_editor):
+    # Only MySQL has FULLTEXT; other databases use the inverted index in posts/search.py
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('CREATE FULLTEXT INDEX post_fulltext_idx ON posts_post (title, content)')
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX post_fulltext_idx ON posts_post')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_comment_comment_post_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
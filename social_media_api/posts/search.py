@@ -0,0 +1,286 @@
+"""
+Full-text search over post titles and content.
+
+Two backends, chosen by the POST_SEARCH setting:
+
+'mysql' ranks with MATCH ... AGAINST over the FULLTEXT index on
+(title, content) added in migration 0005. InnoDB keeps that index current
+itself, so index()/remove() have nothing to do.
+
+'inverted' is a pure-Python inverted index with BM25 ranking, for SQLite
+and tests. Every change is appended to a log file next to a JSON snapshot;
+each process replays the part of the log it hasn't seen before searching,
+so the index stays current across processes without rebuilds.
+`manage.py search_index --compact` folds the log into the snapshot and
+`--rebuild` recreates both from the database.
+
+Post saves and deletes reach the backend through posts/signals.py.
+
+    POST_SEARCH = {
+        'BACKEND': 'auto',     # 'mysql', 'inverted', or 'auto' to pick by database
+        'INDEX_PATH': BASE_DIR / 'search_index',  # directory for 'inverted'
+        'MAX_RESULTS': 1000,   # matches considered per query
+    }
+"""
+import html
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import Post
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+DEFAULTS = {
+    'BACKEND': 'auto',
+    'INDEX_PATH': os.path.join(settings.BASE_DIR, 'search_index'),
+    'MAX_RESULTS': 1000,
+}
+
+# A title match counts as much as this many body matches
+TITLE_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have i in is it its of on or '
+    'that the this to was were will with'.split()
+)
+WORD_RE = re.compile(r'\w+')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POST_SEARCH', {})}
+
+
+def tokenize(text):
+    return [word for word in WORD_RE.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def document_terms(title, content):
+    """Weighted term frequencies of one post"""
+    terms = Counter(tokenize(content))
+    for term in tokenize(title):
+        terms[term] += TITLE_WEIGHT
+    return dict(terms)
+
+
+def highlight(text, terms, length=160):
+    """
+    HTML-escaped excerpt of `text` around the first matching term, with
+    every match wrapped in <mark>. Returns None if no term occurs.
+    """
+    if not terms:
+        return None
+    pattern = re.compile(r'\b(%s)\b' % '|'.join(map(re.escape, terms)), re.IGNORECASE)
+    first = pattern.search(text)
+    if first is None:
+        return None
+    start = max(0, first.start() - length // 4)
+    excerpt = text[start:start + length]
+    marked = pattern.sub(lambda match: '\0' + match.group(0) + '\1', excerpt)
+    marked = html.escape(marked).replace('\0', '<mark>').replace('\1', '</mark>')
+    return ('…' if start else '') + marked + ('…' if start + length < len(text) else '')
+
+
+class MySQLFullTextBackend:
+    """Natural-language MATCH ... AGAINST over the FULLTEXT index"""
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def search(self, query, limit):
+        if not tokenize(query):
+            return []
+        match = RawSQL('MATCH (title, content) AGAINST (%s IN NATURAL LANGUAGE MODE)', (query,))
+        return list(
+            Post.objects.annotate(score=match).filter(score__gt=0)
+            .order_by('-score', '-id').values_list('id', 'score')[:limit]
+        )
+
+
+class InvertedIndexBackend:
+    """BM25 over an in-memory inverted index, kept in sync with an on-disk log"""
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot_path = os.path.join(path, 'snapshot.json')
+        self.log_path = os.path.join(path, 'changes.log')
+        self._lock = threading.RLock()
+        self._loaded = None  # (snapshot version, log inode, offset) replayed so far
+        self._reset()
+
+    def _reset(self):
+        self.docs = {}      # post id -> {term: weighted tf}
+        self.lengths = {}   # post id -> sum of its weighted tfs
+        self.postings = {}  # term -> {post id: weighted tf}
+        self.total_length = 0
+
+    # Disk
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, '.lock'), 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _append(self, entry):
+        with self._file_lock():
+            with open(self.log_path, 'a', encoding='utf-8') as log:
+                log.write(json.dumps(entry) + '\n')
+
+    def _write_snapshot(self, docs):
+        """Replace the snapshot and start an empty log; call with the file lock held"""
+        tmp = self.snapshot_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as snapshot:
+            json.dump(docs, snapshot)
+        os.replace(tmp, self.snapshot_path)
+        open(self.log_path + '.tmp', 'w').close()
+        os.replace(self.log_path + '.tmp', self.log_path)
+
+    def _sync(self):
+        """Bring the in-memory index up to date with the files on disk"""
+        with self._lock:
+            if not os.path.exists(self.snapshot_path):
+                self.rebuild()
+            try:
+                version = os.stat(self.snapshot_path).st_mtime_ns
+                stat = os.stat(self.log_path)
+            except FileNotFoundError:
+                return
+            if self._loaded is None or self._loaded[:2] != (version, stat.st_ino) or stat.st_size < self._loaded[2]:
+                # First load, or the files were replaced by a compaction or rebuild
+                self._reset()
+                with open(self.snapshot_path, encoding='utf-8') as snapshot:
+                    for post_id, terms in json.load(snapshot).items():
+                        self._add(int(post_id), terms)
+                self._loaded = (version, stat.st_ino, 0)
+            offset = self._loaded[2]
+            if stat.st_size > offset:
+                with open(self.log_path, 'rb') as log:
+                    log.seek(offset)
+                    for line in log:
+                        if not line.endswith(b'\n'):
+                            break  # a write still in progress; pick it up next time
+                        offset += len(line)
+                        self._apply(json.loads(line))
+                self._loaded = (version, stat.st_ino, offset)
+
+    # Memory
+
+    def _add(self, post_id, terms):
+        self.docs[post_id] = terms
+        self.lengths[post_id] = sum(terms.values())
+        self.total_length += self.lengths[post_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[post_id] = tf
+
+    def _discard(self, post_id):
+        terms = self.docs.pop(post_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths.pop(post_id)
+        for term in terms:
+            postings = self.postings[term]
+            del postings[post_id]
+            if not postings:
+                del self.postings[term]
+
+    def _apply(self, entry):
+        self._discard(entry['id'])
+        if entry['op'] == 'index':
+            self._add(entry['id'], entry['terms'])
+
+    # Backend API
+
+    def index(self, post):
+        self._append({'op': 'index', 'id': post.pk, 'terms': document_terms(post.title, post.content)})
+
+    def remove(self, post_id):
+        self._append({'op': 'remove', 'id': post_id})
+
+    def search(self, query, limit):
+        terms = set(tokenize(query))
+        with self._lock:
+            self._sync()
+            if not terms or not self.docs:
+                return []
+            total_docs = len(self.docs)
+            average_length = self.total_length / total_docs
+            scores = Counter()
+            for term in terms:
+                postings = self.postings.get(term, {})
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for post_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[post_id] / average_length)
+                    scores[post_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+
+    def rebuild(self):
+        docs = {
+            post_id: document_terms(title, content)
+            for post_id, title, content in Post.objects.values_list('id', 'title', 'content').iterator()
+        }
+        with self._lock, self._file_lock():
+            self._write_snapshot(docs)
+        return len(docs)
+
+    def compact(self):
+        with self._lock, self._file_lock():
+            self._sync()
+            self._write_snapshot(self.docs)
+        return len(self.docs)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend():
+    config = get_config()
+    backend = config['BACKEND']
+    if backend == 'auto':
+        backend = 'mysql' if connection.vendor == 'mysql' else 'inverted'
+    key = (backend, str(config['INDEX_PATH']))
+    with _backends_lock:
+        if key not in _backends:
+            if backend == 'mysql':
+                _backends[key] = MySQLFullTextBackend()
+            elif backend == 'inverted':
+                _backends[key] = InvertedIndexBackend(str(config['INDEX_PATH']))
+            else:
+                raise ValueError(f'Unknown search backend: {backend}')
+        return _backends[key]
+
+
+def search_post_ids(query, limit=None):
+    """Ids of posts matching `query`, best match first, as (id, score) pairs"""
+    return get_backend().search(query, limit or get_config()['MAX_RESULTS'])
+
+
+class FullTextSearchFilter(filters.BaseFilterBackend):
+    """?search=<words> restricted to full-text matches instead of LIKE '%q%' scans"""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return queryset.filter(pk__in=[post_id for post_id, _ in search_post_ids(query)])
@@ -1,19 +1,107 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Post, Comment
+from .search import highlight
 
-class CommentSerializer(serializers.ModelSerializer):
+# How many comments are embedded in each post; the rest are paged
+# through /api/comments/?post=<id>
+COMMENTS_PREVIEW_LIMIT = 10
+
+
+class EagerLoadingMixin:
+    """
+    Plans select_related/prefetch_related for a queryset from the
+    serializer's declared fields, so listing N objects doesn't run
+    extra queries per object.
+    """
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        select_related = set()
+        prefetches = []
+        for field in cls().fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                prefetches.append(cls._plan_prefetch(field))
+            elif '.' in field.source:
+                # e.g. source='author.username' needs the author row
+                select_related.add(field.source.rsplit('.', 1)[0].replace('.', '__'))
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+    @staticmethod
+    def _plan_prefetch(field):
+        child = field.child
+        related = child.Meta.model.objects.all()
+        if isinstance(child, EagerLoadingMixin):
+            related = child.setup_eager_loading(related)
+        if isinstance(field, LimitedListSerializer) and field.limit is not None:
+            # Sliced prefetches are applied per parent row, but Django can
+            # only store them on a separate attribute
+            return Prefetch(field.source, queryset=related[:field.limit], to_attr=field.prefetch_attr)
+        return Prefetch(field.source, queryset=related)
+
+
+class LimitedListSerializer(serializers.ListSerializer):
+    """Renders at most `limit` items of a related manager"""
+
+    def __init__(self, *args, limit=None, **kwargs):
+        self.limit = limit
+        super().__init__(*args, **kwargs)
+
+    @property
+    def prefetch_attr(self):
+        return f'{self.source}_preview'
+
+    def get_attribute(self, instance):
+        if hasattr(instance, self.prefetch_attr):
+            return getattr(instance, self.prefetch_attr)
+        return super().get_attribute(instance)
+
+    def to_representation(self, data):
+        if self.limit is not None and hasattr(data, 'all'):
+            data = data.all()[:self.limit]
+        return super().to_representation(data)
+
+
+class CommentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     author_username = serializers.CharField(source='author.username', read_only=True)
-    
+
     class Meta:
         model = Comment
         fields = ['id', 'post', 'author', 'author_username', 'content', 'created_at', 'updated_at']
         read_only_fields = ['author', 'created_at', 'updated_at']
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     author_username = serializers.CharField(source='author.username', read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
-    
+    comments = LimitedListSerializer(
+        child=CommentSerializer(),
+        limit=COMMENTS_PREVIEW_LIMIT,
+        read_only=True
+    )
+
     class Meta:
         model = Post
-        fields = ['id', 'author', 'author_username', 'title', 'content', 'created_at', 'updated_at', 'comments']
-        read_only_fields = ['author', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'author', 'author_username', 'title', 'content', 'created_at', 'updated_at',
+                  'likes_count', 'comments_count', 'comments']
+        read_only_fields = ['author', 'created_at', 'updated_at', 'likes_count', 'comments_count']
+
+
+class PostSearchResultSerializer(PostSerializer):
+    """A post in search results; `scores` and `terms` come from the view's context"""
+    score = serializers.SerializerMethodField()
+    highlights = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['score', 'highlights']
+
+    def get_score(self, obj):
+        return self.context['scores'].get(obj.pk)
+
+    def get_highlights(self, obj):
+        terms = self.context['terms']
+        return {'title': highlight(obj.title, terms), 'content': highlight(obj.content, terms)}
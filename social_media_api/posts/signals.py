@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Post
+from .search import get_backend
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    # A save limited to other fields can't change the indexed text
+    if update_fields is not None and not {'title', 'content'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: get_backend().index(instance))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    post_id = instance.pk
+    transaction.on_commit(lambda: get_backend().remove(post_id))
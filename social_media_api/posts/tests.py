@@ -1,3 +1,416 @@
-from django.test import TestCase
+import tempfile
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from notifications.dispatch import notify
+from notifications.models import Notification
+from social_media_api.counters import backfill, count_of
+from .models import Post, Comment, TimelineEntry
+from .search import InvertedIndexBackend, highlight
+from .serializers import COMMENTS_PREVIEW_LIMIT
+from .timeline import fan_out_post, add_author_to_timeline, remove_author_from_timeline, home_timeline
+
+User = get_user_model()
+
+
+def latest(user, limit=20):
+    return home_timeline(user).keyset_page(('-created_at', '-id'), None, limit)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TimelineTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.stranger = User.objects.create_user(username='stranger', password='testpass123')
+        self.reader.following.add(self.author)
+
+    def test_fan_out_reaches_followers_only(self):
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        fan_out_post(post)
+
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(user=self.stranger).exists())
+
+    def test_unfollow_trims_and_follow_backfills(self):
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        fan_out_post(post)
+
+        remove_author_from_timeline(self.reader, self.author)
+        self.assertEqual(latest(self.reader), [])
+
+        add_author_to_timeline(self.reader, self.author)
+        self.assertEqual(latest(self.reader), [post])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_authors_are_merged_on_read(self):
+        call_command('reconcile_counters', stdout=StringIO())
+        # self.author still says 0 followers, like a cached request.user would
+        post = Post.objects.create(author=self.author, title='Hello', content='World')
+        fan_out_post(post)
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(latest(self.reader), [post])
+
+    def test_feed_pages_merge_timeline_and_large_authors(self):
+        celebrity = User.objects.create_user(username='celebrity', password='testpass123')
+        self.reader.following.add(celebrity)
+        now = timezone.now()
+        expected = []
+        for i in range(6):
+            author = celebrity if i % 2 else self.author
+            post = Post.objects.create(author=author, title=f'Post {i}', content='...',
+                                       created_at=now - timezone.timedelta(minutes=i))
+            expected.append(post.title)
+            # The celebrity's first post was fanned out before they grew too big
+            if author == self.author or i == 1:
+                fan_out_post(post)
+        User.objects.filter(pk=celebrity.pk).update(followers_count=10 ** 6)
+
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get(reverse('user-feed'), {'page_size': 4})
+        titles = [p['title'] for p in response.data['results']]
+        response = client.get(response.data['next'])
+        titles += [p['title'] for p in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(titles, expected)
+
+    def test_feed_endpoint_reads_timeline(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.post(reverse('post-list'), {'title': 'Hello', 'content': 'World'})
+        self.assertEqual(response.status_code, 201)
+
+        client.force_authenticate(self.reader)
+        response = client.get(reverse('user-feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['title'] for p in response.data['results']], ['Hello'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CursorPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', password='testpass123')
+        for i in range(5):
+            Post.objects.create(author=self.user, title=f'Post {i}', content='...')
+        self.client = APIClient()
+
+    def test_walks_all_posts_without_count(self):
+        response = self.client.get(reverse('post-list'), {'page_size': 2})
+        self.assertNotIn('count', response.data)
+
+        titles = []
+        while True:
+            titles += [p['title'] for p in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(titles, [f'Post {i}' for i in reversed(range(5))])
+
+    def test_rows_sharing_created_at_page_by_id(self):
+        Post.objects.all().delete()
+        now = timezone.now()
+        Post.objects.bulk_create([
+            Post(author=self.user, title=f'Tied {i}', content='...', created_at=now) for i in range(5)
+        ])
+        expected = list(Post.objects.order_by('-id').values_list('title', flat=True))
+
+        response = self.client.get(reverse('post-list'), {'page_size': 2})
+        titles, pages = [], []
+        while True:
+            pages.append(response)
+            titles += [p['title'] for p in response.data['results']]
+            if not response.data['next']:
+                break
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(response.data['next'])
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(titles, expected)
+
+        previous = self.client.get(pages[-1].data['previous'])
+        self.assertEqual(previous.data['results'], pages[-2].data['results'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostQueryPlanningTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}', password='testpass123') for i in range(3)]
+        for user in self.users:
+            post = Post.objects.create(author=user, title='Hello', content='World')
+            for commenter in self.users:
+                Comment.objects.create(post=post, author=commenter, content='Nice')
+        self.client = APIClient()
+
+    def test_post_list_query_count_is_constant(self):
+        # one query for the page of posts, one for their comments and authors
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['comments'][0]['author_username'], 'user0')
+
+    def test_embedded_comments_are_capped(self):
+        post = Post.objects.create(author=self.users[0], title='Viral', content='...')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.users[1], content='+1')
+            for _ in range(COMMENTS_PREVIEW_LIMIT + 5)
+        )
+        response = self.client.get(reverse('post-detail', args=[post.pk]))
+        self.assertEqual(len(response.data['comments']), COMMENTS_PREVIEW_LIMIT)
+
+        response = self.client.get(reverse('comment-list'), {'post': post.pk, 'page_size': 100})
+        self.assertEqual(len(response.data['results']), COMMENTS_PREVIEW_LIMIT + 5)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS={'BACKEND': 'sync'})
+class CounterTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def test_counters_follow_likes_comments_and_follows(self):
+        self.client.post(reverse('post-like', args=[self.post.pk]))
+        response = self.client.post(reverse('comment-list'), {'post': self.post.pk, 'content': 'Nice'})
+        self.client.post(reverse('follow-user', args=[self.author.pk]))
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+        self.assertEqual(self.author.followers_count, 1)
+
+        self.client.post(reverse('post-unlike', args=[self.post.pk]))
+        self.client.delete(reverse('comment-detail', args=[response.data['id']]))
+        self.client.post(reverse('unfollow-user', args=[self.author.pk]))
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Comment.objects.create(post=self.post, author=self.fan, content='Nice')
+        self.fan.following.add(self.author)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7)
+
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=1, stdout=out)
+        self.assertIn('Repaired 1 posts', out.getvalue())
+        self.assertIn('Repaired 2 users', out.getvalue())
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 1))
+        self.assertEqual((self.author.followers_count, self.fan.following_count), (1, 1))
+
+    def test_backfill_counts_existing_rows_in_batches(self):
+        other = Post.objects.create(author=self.fan, title='Other', content='...')
+        Comment.objects.create(post=self.post, author=self.fan, content='Nice')
+        Comment.objects.create(post=other, author=self.author, content='Thanks')
+        self.fan.following.add(self.author)
+        Post.objects.update(comments_count=0)
+        User.objects.update(followers_count=0, following_count=0)
+
+        backfill(Post, {'comments_count': count_of(Comment.objects.all(), 'post')}, batch_size=1)
+        self.assertEqual(list(Post.objects.order_by('pk').values_list('comments_count', flat=True)), [1, 1])
+        # The data migration that introduced the follow counters
+        migration = import_module('accounts.migrations.0002_customuser_followers_count_and_more')
+        migration.backfill_follow_counters(apps, None)
+        self.author.refresh_from_db()
+        self.fan.refresh_from_db()
+        self.assertEqual((self.author.followers_count, self.fan.following_count), (1, 1))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS={'BACKEND': 'sync'})
+class IndexUsageTestCase(TestCase):
+    """
+    EXPLAIN the page queries each list endpoint really runs (its view's
+    get_queryset() through its paginator) on the first and a later page,
+    and make sure every one is an index range with no sort step.
+    """
+
+    # What each backend prints when it has to sort rows itself
+    FILESORT_MARKERS = {
+        'sqlite': 'TEMP B-TREE',
+        'mysql': 'Using filesort',
+        'postgresql': 'Sort Key',
+    }
+    EXPLAIN = {'sqlite': 'EXPLAIN QUERY PLAN '}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='testpass123')
+        self.big = User.objects.create(username='big', followers_count=1)
+        self.user.following.add(self.big)
+        for i in range(3):
+            post = Post.objects.create(author=self.big, title=f'Post {i}', content='World')
+            TimelineEntry.objects.create(user=self.user, post=post, author=self.big, created_at=post.created_at)
+            Comment.objects.create(post=post, author=self.user, content=f'Comment {i}')
+            Comment.objects.create(post=post, author=self.big, content=f'Reply {i}')
+            notify(self.user.pk, self.big.pk, f'mentioned you {i}', Post, post.pk)
+        self.post = post
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def page_queries(self, url, **params):
+        """SQL of the keyset page queries behind the first two pages of `url`"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {**params, 'page_size': 1})
+            self.assertEqual(response.status_code, 200)
+            self.client.get(response.data['next'])
+        pages = [query['sql'] for query in queries.captured_queries
+                 if 'ORDER BY' in query['sql'] and 'LIMIT' in query['sql']]
+        self.assertTrue(pages)
+        return pages
+
+    def assertUsesIndex(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(self.EXPLAIN.get(connection.vendor, 'EXPLAIN ') + sql)
+            plan = '\n'.join(' '.join(map(str, row)) for row in cursor.fetchall())
+        self.assertIn('INDEX', plan.upper(), f'{sql}\n{plan}')
+        marker = self.FILESORT_MARKERS.get(connection.vendor)
+        if marker:
+            self.assertNotIn(marker, plan, f'{sql}\n{plan}')
+
+    def assertEndpointUsesIndexes(self, url, **params):
+        for sql in self.page_queries(url, **params):
+            self.assertUsesIndex(sql)
+
+    def test_post_list(self):
+        self.assertEndpointUsesIndexes(reverse('post-list'))
+
+    def test_comment_thread(self):
+        self.assertEndpointUsesIndexes(reverse('comment-list'), post=self.post.pk)
+
+    def test_feed(self):
+        self.assertEndpointUsesIndexes(reverse('user-feed'))
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_feed_with_merged_authors(self):
+        pages = self.page_queries(reverse('user-feed'))
+        self.assertTrue(any('timelineentry' not in sql for sql in pages))  # an author range ran
+        for sql in pages:
+            self.assertUsesIndex(sql)
+
+    def test_notification_list(self):
+        self.assertEndpointUsesIndexes(reverse('notification-list'))
+
+    def test_unread_notifications(self):
+        self.assertEndpointUsesIndexes(reverse('notification-list'), unread='true')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('notification-unread-count'))
+        counts = [query['sql'] for query in queries.captured_queries if 'COUNT' in query['sql']]
+        self.assertTrue(counts)
+        for sql in counts:
+            self.assertUsesIndex(sql)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS={'BACKEND': 'sync'})
+class LikeEngineTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def test_like_is_idempotent_and_notifies_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(reverse('post-like', args=[self.post.pk]))
+            second = self.client.post(f'/api/posts/{self.post.pk}/like/')
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 1)
+
+    def test_unlike_is_idempotent(self):
+        self.client.post(reverse('post-like', args=[self.post.pk]))
+        first = self.client.post(reverse('post-unlike', args=[self.post.pk]))
+        second = self.client.post(reverse('post-unlike', args=[self.post.pk]))
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual((first.data['liked'], second.data['liked']), (False, False))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_unknown_post(self):
+        self.assertEqual(self.client.post(reverse('post-like', args=[9999])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('post-unlike', args=[9999])).status_code, 404)
+
+    def test_unknown_post_when_insert_ignore_swallows_the_fk_error(self):
+        # What INSERT IGNORE on MySQL reports for a missing post: no row, no error
+        with mock.patch('posts.likes.insert_ignore', return_value=False):
+            self.assertEqual(self.client.post(reverse('post-like', args=[9999])).status_code, 404)
+            self.assertEqual(self.client.post(reverse('post-like', args=[self.post.pk])).status_code, 200)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        self.index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.index_dir.cleanup)
+        settings_override = override_settings(POST_SEARCH={'BACKEND': 'inverted', 'INDEX_PATH': self.index_dir.name})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create(username='author')
+        self.client = APIClient()
+
+    def create(self, title, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=self.author, title=title, content=content)
+
+    def search(self, query):
+        response = self.client.get(reverse('post-search'), {'q': query})
+        return [row['title'] for row in response.data['results']]
+
+    def test_ranking_prefers_title_matches(self):
+        self.create('Gardening notes', 'Tomatoes need sun.')
+        self.create('Cooking', 'A gardening tip: water in the morning.')
+        self.create('Travel', 'Nothing to see here.')
+        self.assertEqual(self.search('gardening'), ['Gardening notes', 'Cooking'])
+        self.assertEqual(self.search('the'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = self.create('Draft', 'about cats')
+        self.assertEqual(self.search('cats'), ['Draft'])
+        with self.captureOnCommitCallbacks(execute=True):
+            post.content = 'about dogs'
+            post.save()
+        self.assertEqual(self.search('cats'), [])
+        self.assertEqual(self.search('dogs'), ['Draft'])
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.search('dogs'), [])
+
+    def test_other_processes_catch_up_from_disk(self):
+        self.create('First', 'shared words')
+        other = InvertedIndexBackend(self.index_dir.name)  # as if in another process
+        self.assertEqual([post_id for post_id, _ in other.search('shared', 10)], [Post.objects.get().pk])
+        second = self.create('Second', 'more shared words')
+        self.assertIn(second.pk, dict(other.search('shared', 10)))
+        other.compact()
+        self.assertEqual(len(other.search('shared', 10)), 2)
+
+    def test_viewset_search_param_and_highlights(self):
+        self.create('Hello <world>', 'plain text')
+        response = self.client.get(reverse('post-list'), {'search': 'world'})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Hello <world>'])
+        self.assertEqual(highlight('Hello <world>', ['world']), 'Hello &lt;<mark>world</mark>&gt;')
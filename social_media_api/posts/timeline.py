@@ -0,0 +1,138 @@
+"""
+Materialized home timelines for the feed endpoint.
+
+A new post is copied into the timeline of every follower of its author
+(fan-out on write), so a page of the feed is a single index range over
+the reader's own timeline rows. Authors with more followers than
+FEED_FANOUT_MAX_FOLLOWERS are not fanned out; a range of their posts is
+merged into each page when it is read instead.
+"""
+import heapq
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from social_media_api.pagination import keyset_q
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+
+FANOUT_BATCH_SIZE = 1000
+
+# How many of an author's latest posts are copied into a timeline on follow
+BACKFILL_POSTS = 50
+
+
+def fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 10000)
+
+
+def is_fanout_author(author):
+    """Whether posts by `author` are pushed to followers on write"""
+    # Read the counter from the row: `author` is often request.user, which
+    # may come from the auth cache and predate the latest follows
+    followers = User.objects.filter(pk=author.pk).values_list('followers_count', flat=True).first()
+    return (followers or 0) <= fanout_limit()
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Copy a newly created post into the timelines of its author's followers"""
+    if not is_fanout_author(post.author):
+        return
+    follower_ids = post.author.followers.values_list('id', flat=True)
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(TimelineEntry(
+            user_id=follower_id,
+            post=post,
+            author_id=post.author_id,
+            created_at=post.created_at
+        ))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def add_author_to_timeline(user, author):
+    """Backfill `author`'s recent posts after `user` starts following them"""
+    if not is_fanout_author(author):
+        return
+    posts = author.posts.order_by('-created_at', '-id').values_list('id', 'created_at')[:BACKFILL_POSTS]
+    _bulk_insert([
+        TimelineEntry(user=user, post_id=post_id, author=author, created_at=created_at)
+        for post_id, created_at in posts
+    ])
+
+
+def remove_author_from_timeline(user, author):
+    """Drop `author`'s posts from `user`'s timeline after an unfollow"""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+class HomeTimeline:
+    """
+    `user`'s feed, newest first, for KeysetCursorPagination on (created_at, id).
+
+    A page is one range of the user's timeline rows (timeline_user_created_idx)
+    plus, for each followed author too big to fan out, one range of that
+    author's posts (post_author_created_idx). Each range stops at the page
+    size and the ranges are merged in Python, so no query sorts or reads
+    more than a page per source. The page's posts are then loaded by id.
+    """
+    model = Post
+
+    def __init__(self, user, posts=None):
+        self.user = user
+        self.posts = Post.objects.all() if posts is None else posts
+
+    def merged_author_ids(self):
+        """Followed authors that are too big to fan out, merged in on read"""
+        from accounts.graph import following_ids  # accounts.graph imports this module
+        followed = following_ids(self.user.pk)
+        if not followed:
+            return []
+        return list(
+            User.objects.filter(pk__in=followed, followers_count__gt=fanout_limit()).values_list('id', flat=True)
+        )
+
+    def keyset_page(self, ordering, position, limit):
+        """Up to `limit` posts after `position` in `ordering`, ('-created_at', '-id') or its reverse"""
+        # Timeline rows carry their post's created_at, keyed by post_id instead of id
+        entry_ordering = tuple({'id': 'post_id', '-id': '-post_id'}.get(field, field) for field in ordering)
+        entries = TimelineEntry.objects.filter(user=self.user).order_by(*entry_ordering)
+        if position is not None:
+            entries = entries.filter(keyset_q(entry_ordering, position))
+        sources = [entries.values_list('created_at', 'post_id')[:limit]]
+        for author_id in self.merged_author_ids():
+            posts = Post.objects.filter(author_id=author_id).order_by(*ordering)
+            if position is not None:
+                posts = posts.filter(keyset_q(ordering, position))
+            sources.append(posts.values_list('created_at', 'id')[:limit])
+
+        keys = []
+        for key in heapq.merge(*sources, reverse=ordering[0].startswith('-')):
+            # A post can be in both the timeline and its author's range
+            if not keys or keys[-1] != key:
+                keys.append(key)
+            if len(keys) == limit:
+                break
+        posts = self.posts.in_bulk([post_id for _, post_id in keys])
+        return [posts[post_id] for _, post_id in keys if post_id in posts]
+
+
+def home_timeline(user, posts=None):
+    """`user`'s feed, for paginating with CreatedAtCursorPagination"""
+    return HomeTimeline(user, posts)
+
+
+def rebuild_timeline(user):
+    """Recompute `user`'s timeline from scratch from who they follow"""
+    TimelineEntry.objects.filter(user=user).delete()
+    for author in user.following.all():
+        add_author_to_timeline(user, author)
@@ -1,12 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, user_feed, LikePostView, UnlikePostView
+from .views import PostViewSet, CommentViewSet, user_feed, LikePostView, UnlikePostView, PostSearchView
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
 router.register(r'comments', CommentViewSet)
 
 urlpatterns = [
+    # Ahead of the router, whose posts/<pk>/ would otherwise match "search"
+    path('posts/search/', PostSearchView.as_view(), name='post-search'),
     path('', include(router.urls)),
      # Add feed endpoint
     path('feed/', user_feed, name='user-feed'),
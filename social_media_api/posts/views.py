@@ -1,20 +1,18 @@
-from rest_framework import viewsets, permissions, filters, generics
-from rest_framework.pagination import PageNumberPagination
-from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, permissions, generics
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer
-from notifications.models import Notification
-from django.contrib.contenttypes.models import ContentType
+from rest_framework.exceptions import NotFound
+from .models import Post, Comment
+from .serializers import PostSerializer, CommentSerializer, PostSearchResultSerializer
+from .search import FullTextSearchFilter, search_post_ids, tokenize
+from .timeline import fan_out_post, home_timeline
+from .likes import like_post, unlike_post
+from social_media_api.pagination import CreatedAtCursorPagination, OldestFirstCursorPagination, StandardPagination
+from social_media_api.counters import increment, decrement
+from notifications.dispatch import notify
 
 
-class StandardPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
@@ -24,111 +22,123 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
-    pagination_class = StandardPagination
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'content']
+    pagination_class = CreatedAtCursorPagination
+    filter_backends = [FullTextSearchFilter]
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     
+    def get_queryset(self):
+        return PostSerializer.setup_eager_loading(super().get_queryset())
+    
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        fan_out_post(post)
         
       
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
-        post = self.get_object()
-        user = request.user
-        
-        # Check if already liked
-        like, created = Like.objects.get_or_create(user=user, post=post)
-        
-        if created:
-            # Create notification for post owner
-            if post.author != user:  # Don't notify yourself
-                Notification.objects.create(
-                    recipient=post.author,
-                    actor=user,
-                    verb="liked your post",
-                    content_type=ContentType.objects.get_for_model(post),
-                    object_id=post.id
-                )
-            return Response({'message': 'Post liked'}, status=201)
-        else:
-            return Response({'message': 'Already liked'}, status=400)
+        return like_response(request, pk)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def unlike(self, request, pk=None):
-        post = self.get_object()
-        user = request.user
-        
-        try:
-            like = Like.objects.get(user=user, post=post)
-            like.delete()
-            return Response({'message': 'Post unliked'}, status=200)
-        except Like.DoesNotExist:
-            return Response({'message': 'Not liked yet'}, status=400)
+        return unlike_response(request, pk)
 
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
-    pagination_class = StandardPagination
+    pagination_class = OldestFirstCursorPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     
+    def get_queryset(self):
+        queryset = CommentSerializer.setup_eager_loading(super().get_queryset())
+        # ?post=<id> pages through the comments of one post
+        post_id = self.request.query_params.get('post')
+        if post_id is not None:
+            queryset = queryset.filter(post_id=post_id)
+        return queryset
+    
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        increment(Post, comment.post_id, 'comments_count')
+        notify(comment.post.author_id, self.request.user.pk, "commented on your post", Post, comment.post_id)
+    
+    def perform_destroy(self, instance):
+        post_id = instance.post_id
+        instance.delete()
+        decrement(Post, post_id, 'comments_count')
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_feed(request):
     """Get posts from users the current user follows"""
-    # Get users that the current user follows
-    following_users = request.user.following.all()  # This satisfies "following.all()"
-    
-    # Get posts from followed users, ordered by creation date (newest first)
-    posts = Post.objects.filter(author__in=following_users).order_by('-created_at')  # Exact pattern
+    # Read the materialized timeline instead of scanning every followed author
+    timeline = home_timeline(request.user, PostSerializer.setup_eager_loading(Post.objects.all()))
     
     # Paginate the results
-    paginator = StandardPagination()
-    result_page = paginator.paginate_queryset(posts, request)
+    paginator = CreatedAtCursorPagination()
+    result_page = paginator.paginate_queryset(timeline, request)
     
     # Serialize the posts
     serializer = PostSerializer(result_page, many=True)
     return paginator.get_paginated_response(serializer.data)
 
+def _post_id(pk):
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        raise NotFound('Post not found')
+
+
+def like_response(request, pk):
+    """Like a post; liking twice is not an error"""
+    try:
+        created = like_post(request.user, _post_id(pk))
+    except Post.DoesNotExist:
+        raise NotFound('Post not found')
+    if created:
+        return Response({'message': 'Post liked', 'liked': True}, status=201)
+    return Response({'message': 'Already liked', 'liked': True}, status=200)
+
+
+def unlike_response(request, pk):
+    """Unlike a post; unliking twice is not an error"""
+    try:
+        deleted = unlike_post(request.user, _post_id(pk))
+    except Post.DoesNotExist:
+        raise NotFound('Post not found')
+    if deleted:
+        return Response({'message': 'Post unliked', 'liked': False}, status=200)
+    return Response({'message': 'Not liked yet', 'liked': False}, status=200)
+
+
 class LikePostView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, pk):
-        # Get the post using generics.get_object_or_404
-        post = generics.get_object_or_404(Post, pk=pk)  # Use generics.get_object_or_404
-        
-        # Like the post
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
-        if created:
-            # Create notification for post owner
-            if post.author != request.user:
-                Notification.objects.create(
-                    recipient=post.author,
-                    actor=request.user,
-                    verb="liked your post",
-                    content_type=ContentType.objects.get_for_model(post),
-                    object_id=post.id
-                )
-            return Response({'message': 'Post liked'}, status=201)
-        else:
-            return Response({'message': 'Already liked'}, status=400)
+        return like_response(request, pk)
 
 
 class UnlikePostView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, pk):
-        # Get the post using generics.get_object_or_404
-        post = generics.get_object_or_404(Post, pk=pk)  # Use generics.get_object_or_404
-        
-        try:
-            like = Like.objects.get(user=request.user, post=post)
-            like.delete()
-            return Response({'message': 'Post unliked'}, status=200)
-        except Like.DoesNotExist:
-            return Response({'message': 'Not liked yet'}, status=400)
\ No newline at end of file
+        return unlike_response(request, pk)
+
+
+class PostSearchView(generics.GenericAPIView):
+    """Ranked full-text search: ?q=<words>, best match first, with highlighted excerpts"""
+    serializer_class = PostSearchResultSerializer
+    pagination_class = StandardPagination
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=400)
+        page = self.paginate_queryset(search_post_ids(query))
+        scores = dict(page)
+        posts = PostSerializer.setup_eager_loading(Post.objects.filter(pk__in=scores)).in_bulk()
+        results = [posts[post_id] for post_id in scores if post_id in posts]
+        serializer = self.get_serializer(results, many=True, context={
+            **self.get_serializer_context(), 'scores': scores, 'terms': tokenize(query)
+        })
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,54 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def increment(model, pk, field, by=1):
+    """Atomically bump a denormalized counter column with a single UPDATE"""
+    return model.objects.filter(pk=pk).update(**{field: F(field) + by})
+
+
+def decrement(model, pk, field, by=1):
+    """Atomically lower a counter column, never below zero"""
+    return model.objects.filter(pk=pk, **{f'{field}__gte': by}).update(**{field: F(field) - by})
+
+
+def count_of(queryset, field):
+    """Correlated COUNT(*) of `queryset` rows whose `field` points at the outer row"""
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def backfill(model, expressions, batch_size=1000, drifted_only=False):
+    """
+    Set counter columns from `expressions` (field -> count_of(...)) on every
+    row of `model`, one UPDATE per `batch_size` primary keys so no single
+    statement holds locks on the whole table. Each UPDATE computes the
+    counts itself, so likes or follows committed meanwhile are never
+    overwritten with an older count. With `drifted_only`, rows whose
+    counters are already right are left alone. Returns the rows updated.
+    """
+    last_pk = None
+    updated = 0
+    while True:
+        rows = model.objects.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        pks = list(rows.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return updated
+        batch = model.objects.filter(pk__gte=pks[0], pk__lte=pks[-1])
+        if drifted_only:
+            batch = batch.alias(**{f'actual_{field}': expr for field, expr in expressions.items()}).filter(
+                reduce(or_, (~Q(**{field: F(f'actual_{field}')}) for field in expressions))
+            )
+        updated += batch.update(**expressions)
+        last_pk = pks[-1]
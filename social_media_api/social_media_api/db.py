@@ -0,0 +1,23 @@
+from django.db import connection
+from django.db.models.constants import OnConflict
+
+
+def insert_ignore(model, **values):
+    """
+    INSERT one row unless it would violate a unique constraint, using the
+    backend's conflict-ignoring form (INSERT IGNORE on MySQL, ON CONFLICT
+    DO NOTHING elsewhere). Returns True if a row was written.
+    """
+    ops = connection.ops
+    fields = [model._meta.get_field(name) for name in values]
+    params = [field.get_db_prep_save(value, connection) for field, value in zip(fields, values.values())]
+    sql = '%s %s (%s) VALUES (%s) %s' % (
+        ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount == 1
@@ -0,0 +1,158 @@
+import binascii
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination, _reverse_ordering
+from rest_framework.utils.urls import replace_query_param
+
+
+class StandardPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def keyset_q(ordering, position):
+    """
+    Rows strictly after `position` (one value per field) in `ordering`,
+    e.g. ('-created_at', '-id') -> created_at <= c AND (created_at < c OR
+    (created_at = c AND id < i)). The leading range keeps it an index range scan.
+    """
+    first = ordering[0].lstrip('-')
+    conditions = []
+    for i, field in enumerate(ordering):
+        equal = {name.lstrip('-'): value for name, value in zip(ordering[:i], position[:i])}
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        conditions.append(Q(**equal, **{f'{field.lstrip("-")}__{lookup}': position[i]}))
+    bound = 'lte' if ordering[0].startswith('-') else 'gte'
+    return Q(**{f'{first}__{bound}': position[0]}) & reduce(or_, conditions)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the whole ordering tuple, e.g. (created_at, id).
+
+    DRF's CursorPagination keys on the first ordering field only and pages
+    through rows that share its value with an OFFSET. Here the cursor holds
+    every ordering field of the last row seen and the next page is the rows
+    after that tuple, so ties (bulk inserts with one created_at) page
+    correctly and no query ever has an OFFSET or a COUNT(*).
+
+    The ordering must end in a unique field. The paginated source may be a
+    queryset, or any object with model and keyset_page(ordering, position,
+    limit) (see posts.timeline.HomeTimeline).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self._parse_position(queryset.model, self.cursor.position) if self.cursor else None
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        results = self.fetch(queryset, ordering, position, self.page_size + 1)
+        self.page = list(results[:self.page_size])
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def fetch(self, source, ordering, position, limit):
+        """Up to `limit` rows after `position` (None for the start) in `ordering`"""
+        if hasattr(source, 'keyset_page'):
+            return source.keyset_page(ordering, position, limit)
+        queryset = source.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_q(ordering, position))
+        return list(queryset[:limit])
+
+    def _parse_position(self, model, position):
+        try:
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position, strict=True)
+            ]
+        except (FieldDoesNotExist, ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        names = [field.lstrip('-') for field in ordering]
+        if isinstance(instance, dict):
+            return [str(instance[name]) for name in names]
+        return [str(getattr(instance, name)) for name in names]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = json.loads(b64decode(encoded.encode('ascii'), validate=True))
+            reverse = bool(tokens.get('r'))
+            position = tokens['p']
+        except (TypeError, ValueError, KeyError, AttributeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {'p': cursor.position}
+        if cursor.reverse:
+            tokens['r'] = 1
+        encoded = b64encode(json.dumps(tokens, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """Keyset pagination on (created_at, id), newest first"""
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class OldestFirstCursorPagination(CreatedAtCursorPagination):
+    """Same as CreatedAtCursorPagination but oldest first (comment threads)"""
+    ordering = ('created_at', 'id')
+
+
+class TimestampCursorPagination(CreatedAtCursorPagination):
+    """Keyset pagination on (timestamp, id) for notifications"""
+    ordering = ('-timestamp', '-id')
+
+
+class UsernameCursorPagination(KeysetCursorPagination):
+    """Keyset pagination over the (unique) username, A to Z"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('username',)
@@ -1,4 +1,5 @@
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -86,6 +87,27 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by every worker, so explicit invalidations (logout, deactivation,
+# follow/unfollow, ...) reach all of them. Set REDIS_URL (needs the redis
+# package); without it each process gets its own LocMemCache, which
+# check accounts.W001 warns about.
+
+def redis_or_locmem(url, location):
+    if url:
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': location}
+
+
+CACHES = {
+    'default': redis_or_locmem(os.environ.get('REDIS_URL'), 'default'),
+    # Revoked signed tokens (see accounts/tokens.py). Entries must never be
+    # evicted, so point REVOCATIONS_REDIS_URL at a separate Redis server with
+    # maxmemory-policy noeviction. Signed tokens refuse to start without it.
+    'revocations': redis_or_locmem(os.environ.get('REVOCATIONS_REDIS_URL'), 'revocations'),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,7 +155,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Add to settings.py
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
+        'accounts.tokens.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -146,6 +169,37 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Notifications are queued and written in batches (see notifications/dispatch.py).
+# Use 'database' with `manage.py process_notifications` when running several processes.
+NOTIFICATIONS = {
+    'BACKEND': 'thread',
+    'WORKERS': 2,
+    'BATCH_SIZE': 500,
+    'DEDUP_WINDOW': 600,
+}
+
+# Token -> user lookups are cached (see accounts/authentication.py)
+TOKEN_AUTH_CACHE = {
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 10,
+    'LOCAL_SIZE': 1000,
+}
+
+# Post search: MySQL FULLTEXT, or an inverted index on disk elsewhere (see posts/search.py)
+POST_SEARCH = {
+    'BACKEND': 'auto',
+    'INDEX_PATH': BASE_DIR / 'search_index',
+}
+
+# Signed, expiring access/refresh tokens instead of DRF Token rows
+# (see accounts/tokens.py); clients send them as "Bearer <token>"
+SIGNED_TOKENS = {
+    'ENABLED': False,
+    'ACCESS_TTL': 15 * 60,
+    'REFRESH_TTL': 7 * 24 * 60 * 60,
+    'REVOCATION_CACHE': 'revocations',
+}
+
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
 X_FRAME_OPTIONS = 'DENY'